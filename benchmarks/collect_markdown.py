@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of the collector's Markdown conversion: a fresh markdown.markdown() call per document, as collect used to
+make, against a single HtmlConverter reset between documents; also checks that both produce identical HTML.
+
+Usage: collect_markdown.py [documents [lines]]    (default: 200 documents of 150 lines)
+"""
+
+import os, sys, time, markdown
+from mdx_gfm import GithubFlavoredMarkdownExtension
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'collect'))
+
+from collect import preprocess
+from converter import HtmlConverter, _html_header, _html_footer
+from collect_preprocess import outline_lines
+
+
+def convert_reference(outline_content):
+    return (_html_header + markdown.markdown(outline_content, extensions=[GithubFlavoredMarkdownExtension()]) +
+            _html_footer)
+
+
+def main(args):
+    documents = int(args[0]) if args else 200
+    lines = int(args[1]) if len(args) > 1 else 150
+
+    contents = [preprocess(outline_lines(lines, seed)) for seed in range(documents)]
+    converter = HtmlConverter()  # also warms up markdown itself, for the reference to not pay for it either
+
+    start = time.perf_counter()
+    reference = [convert_reference(c) for c in contents]
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    current = [converter.convert(c) for c in contents]
+    current_time = time.perf_counter() - start
+
+    identical = reference == current
+    print('{:>9}  {:>15}  {:>15}  {:>15}  {:>9}'.format('documents', 'reference (ms)', 'converter (ms)',
+                                                        'saved/doc (ms)', 'identical'))
+    print('{:9d}  {:15.2f}  {:15.2f}  {:15.3f}  {:>9}'.format(documents, reference_time * 1e3, current_time * 1e3,
+                                                             (reference_time - current_time) / documents * 1e3,
+                                                             str(identical)))
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    exit(main(sys.argv[1:]))
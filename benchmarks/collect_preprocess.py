@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of collect.preprocess() against the original implementation (kept below as preprocess_reference),
+on generated code outlines of 10k lines and up; also checks that both produce byte-identical output.
+
+Usage: collect_preprocess.py [lines ...]    (outline lengths in lines; default: 10000 50000)
+"""
+
+import os, sys, time, random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'collect'))
+
+from collect import preprocess
+
+_repeat = 3
+
+
+def preprocess_reference(lines):
+    output = ''
+    for line in lines:
+        line_strip = line.strip()
+        if line_strip:
+            if line_strip[0] == '#':
+                hash_index = line.find('#', 1)
+                if line and line[hash_index + 1] != ' ':
+                    line = line.replace('#', '# ', 1)
+                if hash_index == 0:
+                    line = ' ' + line
+                output += line.replace('#', '-', 1)
+            elif line_strip[0] == '|':
+                output += '...' + line
+            elif '"""' in line:
+                output += '\n'
+            else:
+                output += line if output.strip() else '##' + line
+
+    return output
+
+
+def outline_lines(count, seed=0):
+    """
+    :return: lines of a code outline: design recipes, body outlines at several levels and some stray lines.
+    """
+    rng = random.Random(seed)
+    lines = ['"""\n', 'Project {:d} outline\n'.format(seed), '"""\n', '\n']
+    while len(lines) < count:
+        name = 'fxn_{:d}'.format(len(lines))
+        lines += ['"""\n',
+                  'CONTRACT | {} : int str -> bool\n'.format(name),
+                  'PURPOSE  | checks whether `count` matches `label`\n',
+                  'IN/OUTS  | none / none\n',
+                  'EXAMPLES | 1 "one" -> True\n',
+                  '         | 2 "one" -> False   # mismatch\n',
+                  '"""\n']
+        for _ in range(rng.randrange(2, 8)):
+            level = rng.randrange(3)
+            lines.append('    ' * level + rng.choice(['# ', '#']) + 'step {:d}\n'.format(rng.randrange(100)))
+        lines += ['\n', rng.choice(['stray text\n', '\n', '    \n'])]
+
+    return lines[:count]
+
+
+def best_of(repeat, f):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None or elapsed < best else best
+    return best
+
+
+def main(args):
+    counts = [int(a) for a in args] if args else [10000, 50000]
+
+    print('{:>8}  {:>15}  {:>15}  {:>9}'.format('lines', 'reference (ms)', 'preprocess (ms)', 'identical'))
+    for count in counts:
+        lines = outline_lines(count)
+        identical = preprocess(lines).encode() == preprocess_reference(lines).encode()
+
+        reference = best_of(_repeat, lambda: preprocess_reference(lines))
+        current = best_of(_repeat, lambda: preprocess(lines))
+
+        print('{:8d}  {:15.2f}  {:15.2f}  {:>9}'.format(count, reference * 1e3, current * 1e3, str(identical)))
+        if not identical:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main(sys.argv[1:]))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of Parser.separate_example_portions() and Parser.parse_example() on EXAMPLE lines
+with long list, dict and string literals, as found in generated stress tests.
+
+Usage: example_portions.py [size ...]    (approximate line lengths in characters; default: 1000 10000 100000)
+"""
+
+import os, sys, time, random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'processors'))
+
+from parser import Parser
+from function import Function
+from diagnostics import DiagnosticsChannel
+
+_recognized_primitives = ['int', 'float', 'str', 'bool']
+_indent_size = 4
+_repeat = 7
+
+
+def example_line(size, seed=0):
+    """
+    :return: EXAMPLE line of roughly the given length, taking a list, a dict and a str and returning a list.
+    """
+    rng = random.Random(seed)
+    lst = '[' + ', '.join(str(rng.randrange(1000)) for _ in range(size // 20)) + ']'
+    dct = '{' + ', '.join('{:d}: [{:d}, {:d}]'.format(i, rng.randrange(100), rng.randrange(100))
+                          for i in range(size // 40)) + '}'
+    string = '"' + ' '.join(rng.choice(['spam', 'eggs', 'ham']) for _ in range(size // 20)) + '"'
+    return 'EXAMPLES | {} {} {} -> {}\n'.format(lst, dct, string, lst)
+
+
+def best_of(repeat, f):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None or elapsed < best else best
+    return best
+
+
+def main(args):
+    sizes = [int(a) for a in args] if args else [1000, 10000, 100000]
+
+    parser = Parser(_indent_size, _recognized_primitives, DiagnosticsChannel())
+    parser.curr_fx = Function('f', ['list', 'dict', 'str'], 'list')
+
+    print('{:>9}  {:>14}  {:>14}'.format('chars', 'separate (ms)', 'example (ms)'))
+    for size in sizes:
+        line = example_line(size)
+        portion = line[line.index('|') + 1:line.index('->')]
+        parser.line = line
+
+        separate = best_of(_repeat, lambda: parser.separate_example_portions(portion))
+        example = best_of(_repeat, lambda: parser.parse_example(line))
+        parser.channel.drain()
+
+        print('{:9d}  {:14.3f}  {:14.3f}'.format(len(line), separate * 1e3, example * 1e3))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
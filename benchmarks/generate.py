@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+"""
+Seeded generator of realistic code outlines (.oln.py) for benchmarking: every function has a full design recipe
+(contract, purpose naming each argument, in/outs, examples) followed by a body outline, and the same parameters
+and seed always produce the same outline.
+
+Usage: generate.py [-f functions] [-e examples] [-l literal_size] [-d depth] [-s seed] output_path
+"""
+
+import sys, random, argparse
+
+_types = ['int', 'float', 'str', 'bool', 'list', 'dict']
+_words = ['spam', 'eggs', 'ham', 'toast', 'beans', 'bacon']
+_purposes = ['counts how many times {} shows up among {}', 'weighs {} against {}', 'finds {} within {}',
+             'tells whether {} outranks {}']
+
+
+class OutlineParameters:
+    """
+    Shape of a generated code outline.
+    """
+
+    def __init__(self, functions=200, examples=5, literal_size=8, depth=3, seed=0):
+        """
+        :param functions: number of functions.
+        :param examples: number of examples per function.
+        :param literal_size: number of elements of every list, dict and str literal in the examples.
+        :param depth: deepest level of the body outline of a function (0 for a flat one).
+        """
+        self.functions = functions
+        self.examples = examples
+        self.literal_size = literal_size
+        self.depth = depth
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def outline_lines(params):
+    """
+    :param params: OutlineParameters.
+    :return: lines of the code outline, each ending in a newline.
+    """
+    rng = random.Random(params.seed)
+    lines = ['"""\n', 'Project benchmark outline (seed {:d})\n'.format(params.seed), '"""\n', '\n']
+
+    for ndx in range(params.functions):
+        arg_types = [rng.choice(_types) for _ in range(rng.randint(1, 3))]
+        return_type = rng.choice(_types)
+        arg_names = ['{}_{:d}'.format(rng.choice(_words), i) for i in range(len(arg_types))]
+
+        lines += ['"""\n',
+                  'CONTRACT | fxn_{:d} : {} -> {}\n'.format(ndx, ' '.join(arg_types), return_type),
+                  'PURPOSE  | {}\n'.format(get_purpose(rng, arg_names)),
+                  'IN/OUTS  | none / none\n']
+
+        for count in range(params.examples):
+            args = ' '.join(literal(rng, t, params.literal_size) for t in arg_types)
+            lines.append('{} | {} -> {}{}\n'.format('EXAMPLES' if count == 0 else '        ', args,
+                                                    literal(rng, return_type, params.literal_size),
+                                                    rng.choice(['', '', '   # since {}'.format(rng.choice(_words))])))
+
+        lines.append('"""\n')
+        lines += body_outline(rng, params.depth)
+        lines.append('\n')
+
+    return lines
+
+
+def get_purpose(rng, arg_names):
+    names = ['`{}`'.format(name) for name in arg_names]
+    if len(names) == 1:
+        return 'returns what becomes of {}'.format(names[0])
+    return rng.choice(_purposes).format(', '.join(names[:-1]), names[-1])
+
+
+def literal(rng, type, size):
+    """
+    :return: literal of the given type; lists, dicts and strs have the given number of elements (or words).
+    """
+    if type == 'int':
+        return str(rng.randint(-999, 9999))
+    elif type == 'float':
+        return '{:.2f}'.format(rng.uniform(-100, 100))
+    elif type == 'bool':
+        return rng.choice(['True', 'False'])
+    elif type == 'str':
+        return '"{}"'.format(' '.join(rng.choice(_words) for _ in range(max(size, 1))))
+    elif type == 'list':
+        return '[{}]'.format(', '.join(str(rng.randint(0, 999)) for _ in range(size)))
+    else:
+        return '{{{}}}'.format(', '.join('{:d}: {:d}'.format(i, rng.randint(0, 999)) for i in range(size)))
+
+
+def body_outline(rng, depth):
+    """
+    :return: lines of a body outline descending to the given depth and back.
+    """
+    levels = list(range(depth + 1)) + list(range(depth - 1, -1, -1))
+    levels += [rng.randint(0, depth) for _ in range(rng.randint(0, 3))]
+    return ['    ' * level + '# step {:d}: take care of {}\n'.format(ndx + 1, rng.choice(_words))
+            for ndx, level in enumerate(levels)]
+
+
+def add_arguments(arg_parser):
+    """
+    Add the parameters of OutlineParameters as command line options.
+    """
+    defaults = OutlineParameters()
+    arg_parser.add_argument('-f', '--functions', type=int, default=defaults.functions, metavar='n',
+                            help='number of functions (default: {:d})'.format(defaults.functions))
+    arg_parser.add_argument('-e', '--examples', type=int, default=defaults.examples, metavar='n',
+                            help='examples per function (default: {:d})'.format(defaults.examples))
+    arg_parser.add_argument('-l', '--literal-size', type=int, default=defaults.literal_size, metavar='n',
+                            help='elements per list, dict and str literal (default: {:d})'.format(defaults.literal_size))
+    arg_parser.add_argument('-d', '--depth', type=int, default=defaults.depth, metavar='n',
+                            help='deepest body outline level (default: {:d})'.format(defaults.depth))
+    arg_parser.add_argument('-s', '--seed', type=int, default=defaults.seed, metavar='n',
+                            help='random seed (default: {:d})'.format(defaults.seed))
+
+
+def get_parameters(options):
+    return OutlineParameters(options.functions, options.examples, options.literal_size, options.depth, options.seed)
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser(prog='generate.py', description='Generate a code outline for benchmarking.')
+    add_arguments(arg_parser)
+    arg_parser.add_argument('output_path', help='path to write the code outline to (.oln.py)')
+    options = arg_parser.parse_args(args)
+
+    with open(options.output_path, 'w') as f:
+        f.writelines(outline_lines(get_parameters(options)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+"""
+Memory benchmark of the parsed representation of code outlines, for runs holding every function of a whole term
+in memory at once: parses a generated code outline (see generate.py) with 100k functions by default, keeping all of
+them, into the current representation (slotted Function, Example records) and into the original one (kept below as
+ReferenceFunction and ReferenceExample), and reports the memory each of them takes up; also checks that both parse
+into the same functions.
+
+Each representation is parsed in a fresh process, and measured by how much its resident memory grows from before
+parsing to after (the lines of the code outline are generated beforehand); tracemalloc would slow parsing down
+too much at this size. Resident memory is read from /proc where there is one, and is the peak otherwise.
+
+Usage: memory.py [outline options, see generate.py]
+"""
+
+import os, sys, gc, argparse, hashlib, resource
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'processors'))
+
+import parser
+from diagnostics import DiagnosticsChannel
+from function import Function, ExampleBuilder
+from generate import add_arguments, get_parameters, outline_lines
+
+_recognized_primitives = ['int', 'float', 'str', 'bool']
+_indent_size = 4
+
+
+class ReferenceFunction:
+
+    def __init__(self, name, args, return_type):
+        self.name = name
+        self.args_types = args
+        self.return_type = return_type
+        self.purpose = None
+        self.args_names = ([None] * len(self.args_types)) if self.args_types[0].lower() != 'none' else []
+        self.return_name = None
+        self.design_recipe_lines = []
+        self.ins = None
+        self.outs = None
+        self.in_outs_source = []
+        self.examples = []
+        self.body_outlines = []
+        self.line_range = None
+
+    validate_completion = Function.validate_completion
+
+
+class ReferenceExample:
+    """
+    Example as it was: an object of its own, referring back to its function, and built in place.
+    """
+
+    def __init__(self, function, types):
+        self.fxn = function
+        self.args = None
+        self.expt = None
+        self.expl = None
+
+        self.arity_count = 0
+        self.types = types
+
+    add_arg = ExampleBuilder.add_arg
+    add_rtrn = ExampleBuilder.add_rtrn
+    eval_value_str = ExampleBuilder.eval_value_str
+
+    def build(self):
+        return self
+
+
+def parse(lines):
+    p = parser.Parser(_indent_size, _recognized_primitives, DiagnosticsChannel())
+    for line in lines:
+        p.parse(line)
+    p.signal_EOF()
+    return p.functions
+
+
+def parse_reference(lines):
+    current = parser.Function, parser.ExampleBuilder
+    parser.Function, parser.ExampleBuilder = ReferenceFunction, ReferenceExample
+    try:
+        return parse(lines)
+    finally:
+        parser.Function, parser.ExampleBuilder = current
+
+
+def measure(name, params):
+    """
+    Parse the code outline into the given representation, in a process of its own.
+    :return: growth of resident memory in bytes, and a digest of the functions parsed.
+    """
+    lines = outline_lines(params)
+    gc.collect()
+    before = get_resident()
+
+    functions = _representations[name](lines)
+    gc.collect()
+    size = get_resident() - before
+
+    return size, hashlib.sha1(repr(summarize(functions)).encode()).hexdigest()
+
+
+def get_resident():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def summarize(functions):
+    return [(f.name, f.args_names, f.design_recipe_lines, f.body_outlines, f.line_range,
+             [(ex.args, ex.expt, ex.expl) for ex in f.examples]) for f in functions]
+
+
+_representations = {'reference': parse_reference, 'current': parse}
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser(prog='memory.py', description='Measure the memory parsed functions retain.')
+    add_arguments(arg_parser)
+    arg_parser.set_defaults(functions=100000)
+    params = get_parameters(arg_parser.parse_args(args))
+
+    print('{:d} functions, {:d} examples'.format(params.functions, params.functions * params.examples))
+    print('{:<10}  {:>12}  {:>14}'.format('', 'total (MiB)', 'per function'))
+
+    digests = []
+    for name in _representations:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            size, digest = pool.submit(measure, name, params).result()
+        digests.append(digest)
+
+        print('{:<10}  {:12.1f}  {:12,.0f} B'.format(name, size / 2 ** 20, size / params.functions))
+
+    identical = len(set(digests)) == 1
+    print('identical: {}'.format(identical))
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    exit(main(sys.argv[1:]))
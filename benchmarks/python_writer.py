@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of PythonWriter.write_template() and write_unittest() against the original implementation (kept below as
+ReferenceWriter), on generated code outlines with hundreds of functions and examples, written to real files;
+also checks that both produce identical files.
+
+Usage: python_writer.py [functions ...]    (functions per code outline; default: 200 1000)
+"""
+
+import os, sys, time, random, tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'processors'))
+
+from parser import Parser
+from python_writer import PythonWriter
+from diagnostics import DiagnosticsChannel
+
+_recognized_primitives = ['int', 'float', 'str', 'bool']
+_indent_size = 4
+_examples = 6  # per function
+_repeat = 5
+
+
+class ReferenceWriter(PythonWriter):
+
+    def write_template(self, file):
+        try:
+            file.write(self.get_template_header())
+
+            for fxn in self.fxns:
+                fxn_template = self.get_template_function(fxn)
+                file.writelines(fxn_template)
+
+        except IOError:
+            return False
+
+        return True
+
+    def write_unittest(self, file):
+        try:
+            file.write(self.get_unittest_header())
+            file.write(self.get_unittest_class_wrapper())
+
+            for fxn in self.fxns:
+                tests = self.get_unittests(fxn)
+                file.writelines(tests)
+
+            file.write(self.get_unittest_footer())
+
+        except IOError:
+            return False
+
+        return True
+
+    def get_template_function(self, fxn):
+        indent = '    '
+
+        header = 'def {}({}):\n'.format(fxn.name, str(fxn.args_names).lstrip('[').rstrip(']').replace('\'', ''))
+
+        design_recipe = indent + '"""\n'
+        for drl in fxn.design_recipe_lines:
+            design_recipe += indent + drl
+        design_recipe += indent + '"""\n'
+
+        body = indent + 'pass    # delete "pass" once you have real code for this function!\n'
+
+        outline = '\n'
+        for oln, level in fxn.body_outlines:
+            outline += indent + (level * indent) + oln + '\n\n'
+
+        return header + design_recipe + body + outline + '\n'
+
+    def get_unittests(self, fxn):
+        indent = '    '
+        tests = '\n' if fxn.examples else ''
+
+        for count, ex in enumerate(fxn.examples):
+            header = indent + 'def test_{}_{:d}(self):\n'.format(fxn.name, count + 1)
+            expl = (indent * 2) + ex.expl + '\n' if ex.expl else ''
+
+            expected = self.format_return_val(ex.expt)
+            assert_type = self.determine_assert_type(ex.expt)
+            args = str(ex.args).strip()[1:-1]
+            body = (indent * 2) + self.determine_body(assert_type, fxn.name, args, expected)
+
+            tests += header + expl + body + '\n'
+
+        return tests
+
+
+def outline_lines(functions, seed=0):
+    """
+    :return: lines of a code outline with the given number of functions, each with a few examples and body outlines.
+    """
+    rng = random.Random(seed)
+    lines = []
+    for i in range(functions):
+        lines += ['"""\n',
+                  'CONTRACT | fxn_{:d} : int str list -> float\n'.format(i),
+                  'PURPOSE  | weighs `count` copies of `label` against `values`\n',
+                  'IN/OUTS  | none / none\n']
+        for e in range(_examples):
+            lines.append('{} | {:d} "{}" [{:d}, {:d}, {:d}] -> {:.2f}{}\n'.format(
+                'EXAMPLES' if e == 0 else '        ', rng.randrange(100), rng.choice(['spam', 'eggs', 'ham']),
+                rng.randrange(10), rng.randrange(10), rng.randrange(10), rng.uniform(0, 100),
+                rng.choice(['', '   # because of reasons'])))
+        lines.append('"""\n')
+        for _ in range(rng.randrange(2, 6)):
+            lines.append('    ' * rng.randrange(3) + '# step {:d}\n'.format(rng.randrange(100)))
+        lines.append('\n')
+
+    return lines
+
+
+def write_files(writer, directory):
+    with open(os.path.join(directory, 'template.py'), 'w') as f:
+        writer.write_template(f)
+    with open(os.path.join(directory, 'template_tests.py'), 'w') as f:
+        writer.write_unittest(f)
+
+
+def read_files(directory):
+    contents = []
+    for name in ('template.py', 'template_tests.py'):
+        with open(os.path.join(directory, name)) as f:
+            contents.append(f.read())
+    return contents
+
+
+def best_of(repeat, f):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None or elapsed < best else best
+    return best
+
+
+def main(args):
+    counts = [int(a) for a in args] if args else [200, 1000]
+
+    print('{:>9}  {:>8}  {:>15}  {:>15}  {:>9}'.format('functions', 'examples', 'reference (ms)', 'writer (ms)',
+                                                      'identical'))
+    for count in counts:
+        parser = Parser(_indent_size, _recognized_primitives, DiagnosticsChannel())
+        for line in outline_lines(count):
+            parser.parse(line)
+        parser.signal_EOF()
+
+        reference = ReferenceWriter(parser.functions, 'template')
+        current = PythonWriter(parser.functions, 'template')
+
+        with tempfile.TemporaryDirectory() as reference_dir, tempfile.TemporaryDirectory() as current_dir:
+            reference_time = best_of(_repeat, lambda: write_files(reference, reference_dir))
+            current_time = best_of(_repeat, lambda: write_files(current, current_dir))
+            identical = read_files(reference_dir) == read_files(current_dir)
+
+        print('{:9d}  {:8d}  {:15.2f}  {:15.2f}  {:>9}'.format(count, count * _examples, reference_time * 1e3,
+                                                              current_time * 1e3, str(identical)))
+        if not identical:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main(sys.argv[1:]))
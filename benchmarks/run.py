@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark harness: times each stage DRCOP and collect put a code outline through, on an outline from generate.py,
+and reports throughput (outline lines per second) and peak memory for each of them.
+
+    read        reader.read_lines(), decoding the outline into lines
+    parse       Parser, line by line, up to signal_EOF()
+    template    PythonWriter.get_template()
+    unittest    PythonWriter.get_unittest()
+    preprocess  collect.preprocess()
+    html        HtmlConverter.convert() on the preprocessed outline
+
+The collect stages need its dependencies (markdown, mdx_gfm) and are skipped without them. Results can be saved
+as JSON, and compared against results saved before to tell whether a change made a stage faster or slower.
+
+Usage: run.py [outline options, see generate.py] [-r repeat] [--save path] [--baseline path] [--threshold percent]
+"""
+
+import os, sys, json, time, argparse, platform, tracemalloc
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..', 'processors'))
+sys.path.insert(0, os.path.join(here, '..', 'collect'))
+
+from parser import Parser
+from python_writer import PythonWriter
+from reader import read_lines
+from diagnostics import DiagnosticsChannel
+from generate import add_arguments, get_parameters, outline_lines
+
+try:
+    from collect import preprocess
+    from converter import HtmlConverter
+except ImportError as e:
+    preprocess = HtmlConverter = None
+    _collect_missing = str(e)
+
+_recognized_primitives = ['int', 'float', 'str', 'bool']
+_indent_size = 4
+_results_format = 1
+
+
+def parse(lines):
+    parser = Parser(_indent_size, _recognized_primitives, DiagnosticsChannel())
+    for line in lines:
+        parser.parse(line)
+    parser.signal_EOF()
+    return parser
+
+
+def get_stages(lines):
+    """
+    :return: list of (name, function timed) for every stage that can be run; each function runs a stage once,
+             on inputs prepared beforehand.
+    """
+    functions = parse(lines).functions
+    writer = PythonWriter(functions, 'benchmark')
+
+    contents = ''.join(lines).encode()
+    stages = [('read', lambda: read_lines(contents)),
+              ('parse', lambda: parse(lines)),
+              ('template', writer.get_template),
+              ('unittest', writer.get_unittest)]
+
+    if preprocess:
+        converter = HtmlConverter()
+        preprocessed = preprocess(lines)
+        stages += [('preprocess', lambda: preprocess(lines)),
+                   ('html', lambda: converter.convert(preprocessed))]
+
+    return stages
+
+
+def measure(f, repeat):
+    """
+    :return: best time of the given number of runs, in seconds, and peak memory allocated by a separate run, in bytes.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None or elapsed < best else best
+
+    # traced apart from the timed runs, which it would slow down considerably
+    tracemalloc.start()
+    try:
+        f()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return best, peak
+
+
+def run(params, repeat):
+    """
+    :return: results as stored in JSON: the outline parameters, the environment and a dict of stages.
+    """
+    lines = outline_lines(params)
+    results = {'format': _results_format,
+               'python': platform.python_version(),
+               'machine': platform.machine(),
+               'outline': dict(params.to_dict(), lines=len(lines)),
+               'stages': {}}
+
+    for name, f in get_stages(lines):
+        seconds, peak = measure(f, repeat)
+        results['stages'][name] = {'seconds': seconds, 'lines_per_second': len(lines) / seconds,
+                                   'peak_bytes': peak}
+
+    return results
+
+
+def print_results(results, baseline=None):
+    """
+    :param baseline: results to compare against, if any.
+    """
+    outline = results['outline']
+    print('{:d} lines: {:d} functions, {:d} examples each, literals of {:d}, body outline depth {:d} (seed {:d})'.format(
+        outline['lines'], outline['functions'], outline['examples'], outline['literal_size'], outline['depth'],
+        outline['seed']))
+
+    header = '{:<11}  {:>10}  {:>12}  {:>10}'.format('stage', 'time (ms)', 'lines/s', 'peak (KiB)')
+    print(header + ('  {:>13}  {:>8}'.format('baseline (ms)', 'change') if baseline else ''))
+
+    for name, stage in results['stages'].items():
+        row = '{:<11}  {:10.2f}  {:12,.0f}  {:10,.0f}'.format(name, stage['seconds'] * 1e3, stage['lines_per_second'],
+                                                            stage['peak_bytes'] / 1024)
+        before = baseline['stages'].get(name) if baseline else None
+        if before:
+            row += '  {:13.2f}  {:+7.1%}'.format(before['seconds'] * 1e3, get_change(before, stage))
+        print(row)
+
+    if preprocess is None:
+        print('(preprocess and html skipped: {})'.format(_collect_missing))
+
+
+def get_change(before, after):
+    return after['seconds'] / before['seconds'] - 1
+
+
+def get_regressions(results, baseline, threshold):
+    """
+    :param threshold: slowdown tolerated, as a fraction (0.1 for 10%).
+    :return: names of the stages slower than in the baseline by more than the threshold.
+    """
+    return [name for name, stage in results['stages'].items()
+            if name in baseline['stages'] and get_change(baseline['stages'][name], stage) > threshold]
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser(prog='run.py', description='Benchmark the stages of DRCOP and collect.')
+    add_arguments(arg_parser)
+    arg_parser.add_argument('-r', '--repeat', type=int, default=7, metavar='n',
+                            help='timed runs per stage, of which the best counts (default: 7)')
+    arg_parser.add_argument('--save', metavar='path', help='save the results as JSON')
+    arg_parser.add_argument('--baseline', metavar='path', help='compare against results saved before')
+    arg_parser.add_argument('--threshold', type=float, metavar='percent',
+                            help='exit with status 1 if any stage is slower than the baseline by more than this')
+    options = arg_parser.parse_args(args)
+
+    params = get_parameters(options)
+    baseline = None
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('outline', {}).get('lines') and \
+                {k: v for k, v in baseline['outline'].items() if k != 'lines'} != params.to_dict():
+            print('Warning: the baseline was run on a different outline: {}'.format(baseline['outline']),
+                  file=sys.stderr)
+
+    results = run(params, max(options.repeat, 1))
+    print_results(results, baseline)
+
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+
+    if baseline and options.threshold is not None:
+        regressions = get_regressions(results, baseline, options.threshold / 100)
+        if regressions:
+            print('Slower than the baseline by more than {:g}%: {}'.format(options.threshold, ', '.join(regressions)),
+                  file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main(sys.argv[1:]))
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of the state machine of the parser: Parser.re_eval_state() driven by the line classifier and the
+transition table, against the nested prefix checks it replaced (kept below as ReferenceParser). Only the state is
+evaluated, nothing is parsed. Also checks that both go through the exact same states (and previous states) on the
+generated code outline, and on random sequences of lines made up of design recipe headers in any case, triple
+quotes, hashes and arrows.
+
+Usage: state_machine.py [outline options, see generate.py]
+"""
+
+import os, sys, time, random, argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'processors'))
+
+from parser import Parser, State
+from diagnostics import DiagnosticsChannel
+from generate import add_arguments, get_parameters, outline_lines
+
+_recognized_primitives = ['int', 'float', 'str', 'bool']
+_indent_size = 4
+_repeat = 15
+
+# pieces random lines are made of; dotless i and long s are upper-cased to ASCII by str.upper()
+_fragments = ['"""', '#', 'CONTRACT', 'contract', 'PURPOSE', 'Purpose', 'purſose', 'IN/OUTS', 'in/outs',
+              'ın/outs', 'EXAMPLE', 'Examples', 'example', '->', '-', '>', '|', ':', 'C', 'x', ' ', '    ']
+_random_sequences = 20000
+_random_length = 30
+
+
+class ReferenceParser(Parser):
+    """
+    Parser evaluating its state as it used to: prefix checks nested by primary state, one header after the other.
+    """
+
+    def re_eval_state(self, line):
+        line = line.strip()
+        # current primary state is INIT
+        if self.state.is_in(State.Primary.INIT):
+            if line[:3] == '"""':
+                self.update_state(State.Primary.BLOCK, State.Sub.NONE)
+            elif line[:1] == '#':
+                self.update_state(State.Primary.BODY_OUTLINE, State.Sub.NONE)
+            else:
+                self.maintain_state()
+        # current primary state is BLOCK
+        elif self.state.is_in(State.Primary.BLOCK):
+            if line[:3] == '"""':
+                self.update_state(State.Primary.INIT, State.Sub.NONE)
+            else:
+                if not self.check_and_update_design_recipe_sub_states(line):
+                    self.maintain_state()
+        # current primary state is DESIGN_RECIPE
+        elif self.state.is_in(State.Primary.DESIGN_RECIPE):
+            if line[:3] == '"""':
+                self.update_state(State.Primary.BLOCK, State.Sub.NONE)
+                self.re_eval_state(line)
+            else:
+                if not self.check_and_update_design_recipe_sub_states(line):
+                    self.update_state(State.Primary.DESIGN_RECIPE, State.Sub.NONE)
+        # current primary state is BODY_OUTLINE
+        elif self.state.is_in(State.Primary.BODY_OUTLINE):
+            if line[:3] == '"""':
+                self.update_state(State.Primary.INIT, State.Sub.NONE)
+                self.re_eval_state(line)
+            elif line[:1] == '#':
+                self.update_state(State.Primary.BODY_OUTLINE)
+            else:
+                self.maintain_state()
+        else:
+            self.maintain_state()
+
+    def maintain_state(self):
+        self.update_state(self.state.primary, self.state.sub)
+
+    def check_and_update_design_recipe_sub_states(self, line):
+        primary = State.Primary.DESIGN_RECIPE
+        return self.check_line_header_and_update_sub_state('CONTRACT', line, primary, State.Sub.CONTRACT) or \
+               self.check_line_header_and_update_sub_state('PURPOSE', line, primary, State.Sub.PURPOSE) or \
+               self.check_line_header_and_update_sub_state('IN/OUTS', line, primary, State.Sub.IN_OUTS) or \
+               self.check_line_header_and_update_sub_state('EXAMPLE', line, primary, State.Sub.EXAMPLE)
+
+    def check_line_header_and_update_sub_state(self, line_header_str, line, primary_state, sub_state):
+        if line[:len(line_header_str)].upper() == line_header_str and self.state.sub <= sub_state:
+            self.update_state(primary_state, sub_state)
+            return True
+        elif line_header_str == 'EXAMPLE' and ('->' in line):
+            self.update_state(primary_state, sub_state)
+            return True
+        else:
+            return False
+
+
+def trace_states(parser_class, lines):
+    """
+    :return: state and previous state of the parser after each line, as (primary, sub, prev_primary, prev_sub).
+    """
+    parser = parser_class(_indent_size, _recognized_primitives, DiagnosticsChannel())
+    trace = []
+    for line in lines:
+        parser.re_eval_state(line)
+        prev = parser.prev_state
+        trace.append((parser.state.primary, parser.state.sub, prev.primary if prev else None,
+                      prev.sub if prev else None))
+    return trace
+
+
+def eval_states(parser_class, lines):
+    parser = parser_class(_indent_size, _recognized_primitives, DiagnosticsChannel())
+    for line in lines:
+        parser.re_eval_state(line)
+
+
+def random_lines(rng):
+    return [' ' * rng.randrange(3) + ''.join(rng.choice(_fragments) for _ in range(rng.randrange(4))) + '\n'
+            for _ in range(_random_length)]
+
+
+def best_of(repeat, f):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None or elapsed < best else best
+    return best
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser(prog='state_machine.py', description='Time the state machine of the parser.')
+    add_arguments(arg_parser)
+    params = get_parameters(arg_parser.parse_args(args))
+    lines = outline_lines(params)
+
+    identical = trace_states(ReferenceParser, lines) == trace_states(Parser, lines)
+
+    rng = random.Random(params.seed)
+    mismatches = 0
+    for _ in range(_random_sequences):
+        sequence = random_lines(rng)
+        if trace_states(ReferenceParser, sequence) != trace_states(Parser, sequence):
+            mismatches += 1
+
+    reference = best_of(_repeat, lambda: eval_states(ReferenceParser, lines))
+    current = best_of(_repeat, lambda: eval_states(Parser, lines))
+
+    print('{:d} lines, {:d} random sequences of {:d} lines'.format(len(lines), _random_sequences, _random_length))
+    print('{:>16}  {:>15}  {:>9}'.format('', 'time (ms)', 'klines/s'))
+    for name, elapsed in (('prefix checks', reference), ('table', current)):
+        print('{:>16}  {:15.2f}  {:9.0f}'.format(name, elapsed * 1e3, len(lines) / elapsed / 1e3))
+    print('identical: {} (outline), {:d} mismatching random sequences'.format(identical, mismatches))
+
+    return 0 if identical and not mismatches else 1
+
+
+if __name__ == '__main__':
+    exit(main(sys.argv[1:]))
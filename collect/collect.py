@@ -1,73 +1,413 @@
-import json, sys, os, markdown, pdfkit
-from mdx_gfm import GithubFlavoredMarkdownExtension
+import io, sys, os, time, queue, argparse, threading
+from concurrent.futures import ProcessPoolExecutor
+
+from config import CollectConfig, ConfigError
+from discover import scan
+from render import PdfRenderer
+from converter import ConversionStats, get_converter
+from manifest import Manifest, get_fingerprint, get_config_digest
+from pdfcache import PdfCache, detach, get_digest, get_file_digest
+from tracelog import Trace, get_stage_times
+
+_default_pdf_jobs = 2  # renderer processes running at once
+_html_backlog = 4  # HTML conversions submitted per worker process ahead of time
+_submissions_path = '../data/submissions'
 
 
 def main(args):
-    input_path = args[0]
-    output_path = input_path
+    arg_parser = argparse.ArgumentParser(prog='collect', description='Collect submitted code outlines as HTML and PDF.')
+    arg_parser.add_argument('input_path', help='path to the code outline source')
+    arg_parser.add_argument('output_path', nargs='?', help='path to the generated output (default: input_path)')
+    arg_parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, metavar='n',
+                            help='number of worker processes converting outlines to HTML (default: number of CPUs)')
+    arg_parser.add_argument('--pdf-jobs', type=int, default=_default_pdf_jobs, metavar='n',
+                            help='number of PDF renderers running at once (default: {:d})'.format(_default_pdf_jobs))
+    arg_parser.add_argument('-i', '--incremental', action='store_true',
+                            help='only rebuild submissions that are new, have changed, or are missing any of their outputs')
+    arg_parser.add_argument('-u', '--user', action='append', dest='users', metavar='uid',
+                            help='only collect the given user (may be repeated)')
+    arg_parser.add_argument('-p', '--project', action='append', dest='projects', metavar='name',
+                            help='collect the given project instead of the active ones (may be repeated)')
+    arg_parser.add_argument('--stats', action='store_true', help='print how long the conversion stages took')
+    arg_parser.add_argument('--trace', action='store_true',
+                            help='append the time each file took, stage by stage, to collect-trace.jsonl in the '
+                                 'output path (as does setting DRCOP_TRACE)')
+    arg_parser.add_argument('--debug', action='store_true')
+    options = arg_parser.parse_args(args)
 
-    if len(args) > 1 and args[1] != '--debug':
-        output_path = args[1]
+    input_path = options.input_path
+    output_path = options.output_path or input_path
 
     validate_path(input_path, 'input')
     validate_path(output_path, 'output')
 
-    config = get_config('./config.json')
-    users = config["users"]
-    projects = config["projects"]
-    active = config["active_projects"]
-    pdf_config = config["pdf_config"]
+    try:
+        config = CollectConfig.load('./config.json').select(options.users, options.projects)
+    except ConfigError as e:
+        print('Invalid configuration ./config.json:', file=sys.stderr)
+        for problem in e.problems:
+            print('  - ' + problem, file=sys.stderr)
+        exit(1)
+
+    renderer = PdfRenderer(config.pdf_config, config.pdf_renderer)
 
     if output_path[-1] != '/':
         output_path += '/'
 
-    for ap in active:
-        print('Collecting project [{}]'.format(ap))
-        for count, user in enumerate(users):
-            u = user[0] # uid
-            n = user[1] # name
-            print('\n  [{:02d}] {} ({}@calpoly.edu)'.format(count+1, n.upper(), u))
-            sys.stdout.flush()
-            for f in projects[ap]:
-                print('    {} '.format(f), end='\t\t> ')
-                sys.stdout.flush()
+    # one group of files per user per active project, in the order they are reported
+    groups = []
+    for ap in config.active_projects:
+        for ndx, user in enumerate(config.users):
+            files = [CollectedFile(ap, user.uid, f, output_path) for f in config.projects[ap]]
+            groups.append((ap, ndx == 0, user, files))
+        if not config.users:
+            groups.append((ap, True, None, []))
 
-                html_path = output_path + 'html/{}_{}.html'.format(u, f)
-                outline_file = None
+    # only files actually submitted go on to be converted
+    index = scan(_submissions_path, config.active_projects, config.users_by_uid)
+    missing = [cf for group in groups for cf in group[3] if not index.has(cf.project, cf.uid, cf.name)]
+    for cf in missing:
+        cf.error = 'No such file or directory: {!r}'.format(cf.source_path)
+    print_missing(missing)
 
-                try:
-                    outline_file = open('../data/submissions/{}/{}/{}'.format(ap, u, f),
-                                        'r', encoding='UTF-8')
-                except FileNotFoundError as e:
-                    quote_index = str(e).find("'..")
-                    print('SUBMISSION NOT FOUND {}'.format(str(e)[quote_index:]))
-
-                if outline_file:
-                    print('oln', end='')
-                    sys.stdout.flush()
-
-                    outline_content = preprocess(outline_file.readlines())
-                    html_success = write_html(html_path, outline_content)
-                    if html_success:
-                        print(' html', end='')
-                        sys.stdout.flush()
-                    else:
-                        print('    Failed to write \'{}\'\nCheck permissions?'.format(html_path),
-                              file=sys.stderr, end='\n\n')
-
-                    pdf_path = output_path + 'pdf/{}_{}.pdf'.format(u, f)
-                    pdf_success = write_pdf(pdf_path, html_path, pdf_config)
-                    if pdf_success:
-                        print(' pdf', end='')
-                        sys.stdout.flush()
+    start = time.time()
+    stylesheet_digest = get_file_digest(output_path + 'html/github.css')
+    manifest = Manifest.load(output_path, get_config_digest(config, stylesheet_digest))
+    pdf_cache = PdfCache.open(config.pdf_cache)
+    collector = Collector(renderer, max(options.jobs, 1), max(options.pdf_jobs, 1), manifest, options.incremental,
+                          pdf_cache, stylesheet_digest, Trace.open(options.trace, output_path))
+    try:
+        collector.run(groups)
+    finally:
+        manifest.save()
+        if pdf_cache:
+            pdf_cache.close()
+
+    print_summary([cf for group in groups for cf in group[3]], time.time() - start)
+    if options.stats:
+        print(collector.html_stats)
+        if pdf_cache:
+            lookups = pdf_cache.hits + pdf_cache.misses
+            print('PDF cache: {:d} hit(s), {:d} miss(es){}'.format(
+                pdf_cache.hits, pdf_cache.misses, ', {:.1%} hit rate'.format(pdf_cache.hits / lookups) if lookups else ''))
+        else:
+            print('PDF cache: off')
+
+
+class CollectedFile:
+    """
+    A single submitted file on its way through the collector, and the outcome of each of its stages.
+    """
+
+    def __init__(self, ap, uid, name, output_path):
+        self.project = ap
+        self.uid = uid
+        self.name = name
+        self.source_path = '{}/{}/{}/{}'.format(_submissions_path, ap, uid, name)
+        self.html_path = output_path + 'html/{}_{}.html'.format(uid, name)
+        self.pdf_path = output_path + 'pdf/{}_{}.pdf'.format(uid, name)
+        self.outputs = [get_text_path(self.html_path), self.html_path, self.pdf_path]
+
+        self.error = None  # why the submission could not be read, if it could not
+        self.fingerprint = None  # (mtime_ns, size, sha256) of the submission as read
+        self.html_digest = None  # sha256 of the HTML written
+        self.pdf_key = None  # key of the PDF in the PDF cache, if there is one
+        self.pdf_cached = False  # whether the PDF has been taken from the PDF cache rather than rendered
+        self.stages = None  # wall and CPU time of each stage in the worker process, while tracing
+        self.html_success = None
+        self.pdf_success = None
+        self.unchanged = False  # whether the outputs were up to date, and so left alone
+        self.done = False
+
+
+class Collector:
+    """
+    Pipeline collecting submitted files: a pool of worker processes converts outlines to HTML (CPU-bound),
+    while renderer threads turn finished HTML files into PDFs in batches (waiting on the renderer processes).
+    The two stages are connected by a bounded queue, so neither runs far ahead of the other.
+
+    Progress is reported a user at a time, in the configured order, as soon as all files of that user
+    (and of everyone before them) are done.
+
+    Every file collected successfully is recorded in the manifest; in incremental mode, files the manifest
+    shows to be up to date skip both stages. HTML already rendered before (by any run sharing the PDF cache)
+    skips the PDF stage.
+
+    While tracing, every file finished and every PDF batch rendered is recorded in the trace.
+    """
+
+    def __init__(self, renderer, html_jobs, pdf_jobs, manifest, incremental=False, pdf_cache=None,
+                 stylesheet_digest=None, trace=None):
+        """
+        :param stylesheet_digest: digest of the stylesheet the HTML files link to, as part of the PDF cache key.
+        :param trace: Trace to record into, if tracing.
+        """
+        self.renderer = renderer
+        self.html_jobs = html_jobs
+        self.pdf_jobs = pdf_jobs
+        self.manifest = manifest
+        self.incremental = incremental
+        self.pdf_cache = pdf_cache
+        self.stylesheet_digest = stylesheet_digest
+        self.trace = trace
+        self.html_stats = ConversionStats()
+        self.waiting = {}  # files waiting for the PDF being rendered under each PDF cache key
+        self.finished = 0
+
+        self.pdf_queue = queue.Queue(maxsize=pdf_jobs * renderer.batch_size)
+        self.events = queue.Queue()  # ('html' | 'pdf', ...) completions, handled on the main thread
+
+    def run(self, groups):
+        """
+        :param groups: (project, whether first of the project, User, list of CollectedFile) for every user
+                       of every project collected; User is None for a project without any users.
+        """
+        files = [cf for group in groups for cf in group[3]]
+        renderers = [threading.Thread(target=self.render_pdfs, daemon=True) for _ in range(self.pdf_jobs)]
+        for t in renderers:
+            t.start()
+
+        reported = 0
+        pending = iter(files)
+        in_flight = 0
+        self.finished = 0
+
+        with ProcessPoolExecutor(max_workers=self.html_jobs) as pool:
+            try:
+                while True:
+                    # keep the HTML workers busy without queueing up every single file at once
+                    while in_flight < self.html_jobs * _html_backlog:
+                        cf = next(pending, None)
+                        if not cf:
+                            break
+                        if cf.error:  # not submitted
+                            self.finish(cf)
+                            continue
+                        if self.incremental and self.manifest.is_current(cf.source_path, cf.outputs):
+                            cf.html_success = cf.pdf_success = cf.unchanged = cf.done = True
+                            self.finished += 1
+                            self.record(cf)
+                            continue
+                        future = pool.submit(convert_outline, cf.source_path, cf.html_path, bool(self.trace))
+                        future.add_done_callback(lambda f, cf=cf: self.events.put(('html', cf, f)))
+                        in_flight += 1
+
+                    reported = self.report(groups, reported)
+                    if self.finished == len(files):
+                        break
+
+                    kind, cf, outcome = self.events.get()
+                    if kind == 'html':
+                        in_flight -= 1
+                        cf.error, cf.html_success, cf.fingerprint, cf.html_digest, timing, cf.stages = \
+                            outcome.result()
+                        if timing:
+                            self.html_stats.add(timing)
+                        if cf.error:
+                            self.finish(cf)
+                        else:
+                            self.get_pdf(cf)
                     else:
-                        print('    Failed to write \'{}\'\n'.format(pdf_path) +
-                              '    Check permissions or wkhtmltopdf availability.',
-                              file=sys.stderr, end='\n\n')
+                        cf.pdf_success = outcome
+                        self.finish(cf)
+                        if cf.pdf_key:
+                            self.rendered(cf)
+            finally:
+                for t in renderers:
+                    self.pdf_queue.put(None)
+
+    def get_pdf(self, cf):
+        """
+        Take the PDF of the file from the PDF cache if it is there, wait for it if the same PDF is being rendered
+        already, or have it rendered otherwise.
+        """
+        if self.pdf_cache and cf.html_success:
+            cf.pdf_key = self.pdf_cache.key(self.renderer.args, self.stylesheet_digest, cf.html_digest)
+            if cf.pdf_key in self.waiting:
+                self.waiting[cf.pdf_key].append(cf)
+                return
+            if self.pdf_cache.fetch(cf.pdf_key, cf.pdf_path):
+                cf.pdf_success = cf.pdf_cached = True
+                self.finish(cf)
+                return
+
+            self.waiting[cf.pdf_key] = []
+
+        # the previous PDF may be linked to an entry of the cache the renderer would write into, even if an earlier
+        # run put it there and this one does not use the cache
+        detach(cf.pdf_path)
+        self.pdf_queue.put(cf)
 
-                    if html_success and pdf_success:
-                        print(' - OK')
-                        sys.stdout.flush()
+    def rendered(self, cf):
+        """
+        Add the PDF rendered for the file to the PDF cache, and hand it on to the files waiting for the same one.
+        """
+        waiting = self.waiting.pop(cf.pdf_key)
+        if cf.pdf_success:
+            self.pdf_cache.add(cf.pdf_key, cf.pdf_path)
+
+        for other in waiting:
+            if cf.pdf_success and self.pdf_cache.fetch(other.pdf_key, other.pdf_path):
+                other.pdf_success = other.pdf_cached = True
+                self.finish(other)
+            else:
+                other.pdf_key = None  # rendering it failed once; try again, but do not wait on it twice
+                detach(other.pdf_path)
+                self.pdf_queue.put(other)
+
+    def finish(self, cf):
+        if cf.html_success and cf.pdf_success:
+            self.manifest.record(cf.source_path, cf.fingerprint, cf.outputs)
+        else:
+            self.manifest.forget(cf.source_path)
+        cf.done = True
+        self.finished += 1
+        self.record(cf)
+
+    def record(self, cf):
+        """
+        Record the file just finished in the trace, if tracing.
+        """
+        if not self.trace:
+            return
+
+        status = 'MISSING' if cf.error else 'UNCHANGED' if cf.unchanged else \
+            'OK' if cf.html_success and cf.pdf_success else 'FAILED'
+        self.trace.record(file=cf.source_path, status=status, pdf_cached=cf.pdf_cached, stages=cf.stages or {})
+
+    def render_pdfs(self):
+        """
+        Body of a renderer thread: render whatever HTML files are ready, in batches, until told to stop (None).
+        """
+        while True:
+            batch = [self.pdf_queue.get()]
+            while batch[-1] and len(batch) < self.renderer.batch_size:
+                try:
+                    batch.append(self.pdf_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = not batch[-1]
+            batch = [cf for cf in batch if cf]
+            if batch:
+                start = time.perf_counter()
+                try:
+                    results = self.renderer.render([(cf.html_path, cf.pdf_path) for cf in batch])
+                    if self.trace:
+                        self.trace.record(pdf_batch=[cf.source_path for cf in batch],
+                                          stages={'pdf': {'wall': round(time.perf_counter() - start, 6), 'calls': 1}})
+                except Exception:
+                    # every file of the batch must still be reported, or the main thread would wait on it forever
+                    results = [False] * len(batch)
+
+                for cf, result in zip(batch, results):
+                    self.events.put(('pdf', cf, result))
+
+            if stop:
+                return
+
+    def report(self, groups, reported):
+        """
+        Print every group that is done, up to the first one that is not.
+        :param reported: number of groups reported so far.
+        :return: number of groups reported now.
+        """
+        while reported < len(groups) and all(cf.done for cf in groups[reported][3]):
+            ap, first, user, files = groups[reported]
+            if first:
+                print('Collecting project [{}]'.format(ap))
+            if user:
+                print_user_report(user, files)
+            reported += 1
+
+        return reported
+
+
+def convert_outline(source_path, html_path, traced=False):
+    """
+    HTML stage of the collector, run in a worker process.
+    :param traced: whether to time each step of the stage.
+    :return: error reading the submission (if any, as a string), whether the HTML has been written,
+             the fingerprint of the submission (see manifest.get_fingerprint), the digest of the HTML,
+             the time taken to convert it (see ConversionStats.add) and, if traced, the wall and CPU time
+             of each step, as recorded in the trace.
+    """
+    times = get_stage_times(traced)
+    try:
+        outline_file = open(source_path, 'rb')
+    except FileNotFoundError as e:
+        return str(e), None, None, None, None, None
+
+    with times.stage('read'), outline_file:
+        data = outline_file.read()
+        fingerprint = get_fingerprint(outline_file, data)
+
+    with times.stage('preprocess'):
+        outline_content = preprocess(io.TextIOWrapper(io.BytesIO(data), encoding='UTF-8'))
+
+    with times.stage('markdown'):
+        converter, built = get_converter()
+        start = time.perf_counter()
+        html_content = converter.convert(outline_content)
+        convert_time = time.perf_counter() - start
+
+    with times.stage('write'):
+        html_success = write_html(html_path, outline_content, html_content)
+
+    return None, html_success, fingerprint, get_digest(html_content.encode('UTF-8')), (built, convert_time), \
+        times.to_dict()
+
+
+def print_user_report(user, files):
+    print('\n  [{:02d}] {} ({}@calpoly.edu)'.format(user.number + 1, user.name.upper(), user.uid))
+
+    for cf in files:
+        if cf.error:
+            quote_index = cf.error.find("'..")
+            print('    {} '.format(cf.name), 'SUBMISSION NOT FOUND {}'.format(cf.error[quote_index:]), sep='\t\t> ')
+            continue
+        if cf.unchanged:
+            print('    {} '.format(cf.name), 'unchanged', sep='\t\t> ')
+            continue
+
+        stages = 'oln' + (' html' if cf.html_success else '') + (' pdf' if cf.pdf_success else '')
+        print('    {} '.format(cf.name), stages + (' - OK' if cf.html_success and cf.pdf_success else ''), sep='\t\t> ')
+
+        if not cf.html_success or not cf.pdf_success:
+            sys.stdout.flush()
+            if not cf.html_success:
+                print('    Failed to write \'{}\'\nCheck permissions?'.format(cf.html_path),
+                      file=sys.stderr, end='\n\n')
+            if not cf.pdf_success:
+                print('    Failed to write \'{}\'\n'.format(cf.pdf_path) +
+                      '    Check permissions or wkhtmltopdf availability.',
+                      file=sys.stderr, end='\n\n')
+            sys.stderr.flush()
+
+    sys.stdout.flush()
+
+
+def print_missing(files):
+    if not files:
+        return
+
+    rows = [('project', 'uid', 'file')] + [(cf.project, cf.uid, cf.name) for cf in files]
+    widths = [max(len(row[i]) for row in rows) for i in range(2)]
+
+    print('Missing submissions ({:d}):'.format(len(files)))
+    for project, uid, name in rows:
+        print('  {:{}}  {:{}}  {}'.format(project, widths[0], uid, widths[1], name))
+    print()
+    sys.stdout.flush()
+
+
+def print_summary(files, elapsed):
+    missing = sum(1 for cf in files if cf.error)
+    failed = sum(1 for cf in files if not cf.error and not (cf.html_success and cf.pdf_success))
+    unchanged = sum(1 for cf in files if cf.unchanged)
+    print('\nCollected {:d} file(s) in {:.1f}s: {:d} OK{}, {:d} not submitted, {:d} failed'.format(
+        len(files), elapsed, len(files) - missing - failed,
+        ' ({:d} unchanged)'.format(unchanged) if unchanged else '', missing, failed))
 
 
 def validate_path(path, type='?'):
@@ -77,7 +417,16 @@ def validate_path(path, type='?'):
 
 
 def preprocess(lines):
-    output = ''
+    return ''.join(iter_preprocess(lines))
+
+
+def iter_preprocess(lines):
+    """
+    Convert a code outline into Markdown, a line at a time.
+    :param lines: any iterable of lines of a code outline, i.e. a file object.
+    :return: generator yielding the converted lines.
+    """
+    has_content = False  # whether anything but whitespace has been yielded so far
     for line in lines:
         line_strip = line.strip()
         if line_strip:
@@ -87,29 +436,29 @@ def preprocess(lines):
                     line = line.replace('#', '# ', 1)
                 if hash_index == 0:
                     line = ' ' + line
-                output += line.replace('#', '-', 1)
+                converted = line.replace('#', '-', 1)
             elif line_strip[0] == '|':
-                output += '...' + line
+                converted = '...' + line
             elif '"""' in line:
-                output += '\n'
+                converted = '\n'
             else:
-                output += line if output.strip() else '##' + line
+                converted = line if has_content else '##' + line
+
+            has_content = has_content or not converted.isspace()
+            yield converted
 
-    return output
 
+def get_text_path(html_path):
+    return html_path.replace('.html', '').replace('.oln.py', '.oln.txt')
 
-def write_html(html_path, outline_content):
+
+def write_html(html_path, outline_content, html_content):
     try:
-        oln_re_file = open(html_path.replace('.html', '').replace('.oln.py', '.oln.txt'),
-                           'w', encoding='UTF-8')
-        oln_re_file.writelines(outline_content)
+        oln_re_file = open(get_text_path(html_path), 'w', encoding='UTF-8')
+        oln_re_file.write(outline_content)
 
         html_file = open(html_path, 'w', encoding='UTF-8')
-        html_content = markdown.markdown(outline_content,
-                                         extensions=[GithubFlavoredMarkdownExtension()])
-        html_file.write('<html>\n<head><link rel="stylesheet" href="github.css"></head>\n')
-        html_file.writelines(html_content)
-        html_file.write('\n</html>\n')
+        html_file.write(html_content)
 
         oln_re_file.close()
         html_file.close()
@@ -118,18 +467,6 @@ def write_html(html_path, outline_content):
     return True
 
 
-def write_pdf(pdf_path, html_path, pdf_config):
-    try:
-        pdfkit.from_file(html_path, pdf_path, options=pdf_config)
-    except IOError:
-        return False
-    return True
-
-
-def get_config(json_path):
-    return json.load(open(json_path))
-
-
 if __name__ == '__main__':
     if len(sys.argv) < 2:
         print('Usage: python3 collect <path_to_code_outline_source> [path_to_generated_output]', end='\n\n')
@@ -0,0 +1,205 @@
+"""
+Configuration of the collector (config.json), checked as a whole before any work starts so that a mistake in it is
+reported at once, all problems together, rather than failing halfway through a long run.
+
+    users            list of [uid, name] pairs, in the order they are reported
+    projects         files expected from every user, by project name
+    active_projects  names of the projects collected by default
+    pdf_config       wkhtmltopdf options, i.e. {"page-size": "Letter", "quiet": ""}
+    pdf_renderer     path to the renderer executable (optional; wkhtmltopdf on the PATH by default)
+    pdf_cache        directory of the PDF cache (optional; an empty string turns it off)
+"""
+
+import json
+
+
+class ConfigError(Exception):
+
+    def __init__(self, problems):
+        """
+        :param problems: descriptions of everything wrong with the configuration.
+        """
+        super().__init__('\n'.join(problems))
+        self.problems = problems
+
+
+class User:
+
+    def __init__(self, uid, name, number):
+        """
+        :param number: position of the user in the configuration, counting from 0; kept when filtering users.
+        """
+        self.uid = uid
+        self.name = name
+        self.number = number
+
+
+class CollectConfig:
+
+    def __init__(self, users, projects, active_projects, pdf_config, pdf_renderer=None, pdf_cache=None):
+        """
+        :param users: list of User, in the order they are reported.
+        :param projects: dict of the list of files expected from every user, by project name.
+        :param active_projects: names of the projects to collect.
+        """
+        self.users = users
+        self.projects = projects
+        self.active_projects = active_projects
+        self.pdf_config = pdf_config
+        self.pdf_renderer = pdf_renderer
+        self.pdf_cache = pdf_cache
+
+        self.users_by_uid = {u.uid: u for u in users}
+
+    @staticmethod
+    def load(json_path):
+        """
+        :raise ConfigError: if the file cannot be read, or does not hold a valid configuration.
+        """
+        try:
+            with open(json_path, encoding='UTF-8') as f:
+                data = json.load(f)
+        except OSError as e:
+            raise ConfigError(['cannot read {}: {}'.format(json_path, e.strerror)])
+        except ValueError as e:
+            raise ConfigError(['{} is not valid JSON: {}'.format(json_path, e)])
+
+        return CollectConfig.from_dict(data)
+
+    @staticmethod
+    def from_dict(data):
+        """
+        :raise ConfigError: if the data is not a valid configuration.
+        """
+        if not isinstance(data, dict):
+            raise ConfigError(['configuration must be a JSON object'])
+
+        problems = []
+        for key in ('users', 'projects', 'active_projects', 'pdf_config'):
+            if key not in data:
+                problems.append('"{}" is missing'.format(key))
+
+        users = get_users(data.get('users', []), problems)
+        projects = get_projects(data.get('projects', {}), problems)
+
+        active_projects = data.get('active_projects', [])
+        if not is_list_of_str(active_projects):
+            problems.append('"active_projects" must be a list of project names')
+            active_projects = []
+        for name in active_projects:
+            if name not in projects:
+                problems.append('active project "{}" is not in "projects"'.format(name))
+
+        pdf_config = get_pdf_config(data.get('pdf_config', {}), problems)
+
+        for key in ('pdf_renderer', 'pdf_cache'):
+            if data.get(key) is not None and not isinstance(data[key], str):
+                problems.append('"{}" must be a path'.format(key))
+
+        if problems:
+            raise ConfigError(problems)
+
+        return CollectConfig(users, projects, active_projects, pdf_config, data.get('pdf_renderer'),
+                             data.get('pdf_cache'))
+
+    def select(self, uids=None, projects=None):
+        """
+        :param uids: uids of the users to collect, or None for all of them.
+        :param projects: names of the projects to collect (active or not), or None for the active ones.
+        :return: the configuration restricted to the given users and projects.
+        :raise ConfigError: if any of them is not configured.
+        """
+        problems = ['unknown user "{}"'.format(uid) for uid in uids or [] if uid not in self.users_by_uid]
+        problems += ['unknown project "{}"'.format(name) for name in projects or [] if name not in self.projects]
+        if problems:
+            raise ConfigError(problems)
+
+        users = self.users
+        if uids is not None:
+            selected = set(uids)
+            users = [u for u in self.users if u.uid in selected]
+
+        active_projects = self.active_projects
+        if projects is not None:
+            active_projects = list(dict.fromkeys(projects))
+
+        return CollectConfig(users, self.projects, active_projects, self.pdf_config, self.pdf_renderer,
+                             self.pdf_cache)
+
+
+def get_users(users, problems):
+    if not isinstance(users, list):
+        problems.append('"users" must be a list of [uid, name] pairs')
+        return []
+
+    result = []
+    seen = set()
+    for ndx, user in enumerate(users):
+        if not is_list_of_str(user) or len(user) != 2 or not all(user):
+            problems.append('user #{:d} must be a [uid, name] pair, not {}'.format(ndx + 1, json.dumps(user)))
+            continue
+
+        uid, name = user
+        if uid in seen:
+            problems.append('user "{}" is listed more than once'.format(uid))
+        elif not is_file_name(uid):
+            problems.append('uid "{}" cannot be part of a file name'.format(uid))
+        seen.add(uid)
+        result.append(User(uid, name, ndx))
+
+    return result
+
+
+def get_projects(projects, problems):
+    if not isinstance(projects, dict):
+        problems.append('"projects" must be an object of lists of file names')
+        return {}
+
+    result = {}
+    for name, files in projects.items():
+        if not is_list_of_str(files):
+            problems.append('project "{}" must be a list of file names'.format(name))
+            continue
+
+        for f in files:
+            if not is_file_name(f):
+                problems.append('project "{}": "{}" is not a file name'.format(name, f))
+        if len(set(files)) != len(files):
+            problems.append('project "{}" lists a file more than once'.format(name))
+        result[name] = files
+
+    return result
+
+
+def get_pdf_config(pdf_config, problems):
+    """
+    Options are passed on to the renderer as pdfkit would (see render.get_option_args): a value is either a single
+    one, or a list of values and [name, value] pairs, the option being repeated for each of them.
+    """
+    if not isinstance(pdf_config, dict):
+        problems.append('"pdf_config" must be an object of wkhtmltopdf options')
+        return {}
+
+    for key, value in pdf_config.items():
+        values = value if isinstance(value, list) else [value]
+        if not all(is_option_value(v) or is_option_pair(v) for v in values):
+            problems.append('pdf_config option "{}" must be a value, or a list of values and [name, value] pairs'
+                            .format(key))
+
+    return pdf_config
+
+
+def is_option_value(value):
+    return isinstance(value, (str, int, float))
+
+
+def is_option_pair(value):
+    return isinstance(value, list) and len(value) == 2 and all(is_option_value(v) and v for v in value)
+
+
+def is_list_of_str(value):
+    return isinstance(value, list) and all(isinstance(v, str) for v in value)
+
+
+def is_file_name(name):
+    return bool(name) and name not in ('.', '..') and '/' not in name and '\0' not in name
@@ -0,0 +1,89 @@
+"""
+Markdown to HTML conversion for the collector. Setting up a Markdown converter with the GFM extension means
+building all of its preprocessors, block processors and inline patterns; rather than doing so for every file
+(as markdown.markdown does), each worker process builds a single converter and resets it between documents.
+"""
+
+import time, markdown
+from mdx_gfm import GithubFlavoredMarkdownExtension
+
+_html_header = '<html>\n<head><link rel="stylesheet" href="github.css"></head>\n'
+_html_footer = '\n</html>\n'
+
+_converter = None  # converter of the current process, see get_converter()
+
+
+class HtmlConverter:
+
+    def __init__(self):
+        self.md = new_markdown()
+
+    def convert(self, outline_content):
+        """
+        :param outline_content: code outline, preprocessed into Markdown.
+        :return: complete HTML page.
+        """
+        self.md.reset()
+        return _html_header + self.md.convert(outline_content) + _html_footer
+
+
+class ConversionStats:
+    """
+    Time spent converting documents, summed up over all worker processes.
+    """
+
+    def __init__(self):
+        self.documents = 0
+        self.convert_time = 0.0
+        self.converters = 0
+
+    def add(self, timing):
+        """
+        :param timing: (whether the converter was built for this document, convert_time) of a single document
+                       (see get_converter).
+        """
+        built, convert_time = timing
+        self.documents += 1
+        self.convert_time += convert_time
+        if built:
+            self.converters += 1
+
+    def __str__(self):
+        """
+        What reusing converters saved is estimated by building one more converter here, in the current process.
+        """
+        if not self.documents:
+            return 'Markdown: no documents converted'
+
+        setup = get_setup_time()
+        return ('Markdown: {:d} document(s) at {:.2f} ms each; reusing {:d} converter(s) saved {:.2f} ms '
+                'per document, {:.0f} ms in total').format(
+            self.documents, self.convert_time / self.documents * 1e3, self.converters, setup * 1e3,
+            setup * (self.documents - self.converters) * 1e3)
+
+
+def new_markdown():
+    return markdown.Markdown(extensions=[GithubFlavoredMarkdownExtension()])
+
+
+def get_setup_time():
+    """
+    :return: time it takes to build a converter once markdown itself has been initialized (which happens only once
+             per process either way), i.e. what building one for every document would cost.
+    """
+    new_markdown()
+    start = time.perf_counter()
+    new_markdown()
+    return time.perf_counter() - start
+
+
+def get_converter():
+    """
+    :return: the converter of the current process, and whether it has been built just now.
+    """
+    global _converter
+    if _converter:
+        return _converter, False
+
+    _converter = HtmlConverter()
+    return _converter, True
@@ -0,0 +1,62 @@
+"""
+Discovery of submitted files. Rather than trying to open every expected file one at a time, where on a network file
+system each missing file costs a round trip of its own, every project directory of the submissions tree is listed
+once, and the directories of its users are listed in parallel.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+_scan_jobs = 16  # directories listed at once
+
+
+class SubmissionIndex:
+    """
+    Files present in the submissions tree, by project and uid.
+    """
+
+    def __init__(self, files):
+        """
+        :param files: dict of the set of file names submitted, by (project, uid).
+        """
+        self.files = files
+
+    def has(self, project, uid, name):
+        return name in self.files.get((project, uid), ())
+
+
+def scan(submissions_path, projects, uids, jobs=_scan_jobs):
+    """
+    :param submissions_path: root of the submissions tree, holding a directory per project, then one per uid.
+    :param projects: names of the projects to look into.
+    :param uids: uids of the users to look for.
+    :return: SubmissionIndex of the files found.
+    """
+    uids = set(uids)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        project_paths = [os.path.join(submissions_path, ap) for ap in projects]
+        user_dirs = [(ap, uid, os.path.join(project_path, uid))
+                     for ap, project_path, names in zip(projects, project_paths, pool.map(list_dirs, project_paths))
+                     for uid in names if uid in uids]
+
+        listings = pool.map(list_files, [path for ap, uid, path in user_dirs])
+        return SubmissionIndex({(ap, uid): names for (ap, uid, path), names in zip(user_dirs, listings)})
+
+
+def list_dirs(path):
+    return list_entries(path, os.DirEntry.is_dir)
+
+
+def list_files(path):
+    return list_entries(path, os.DirEntry.is_file)
+
+
+def list_entries(path, is_kind):
+    """
+    :return: set of the names of the entries of the given kind in the directory, empty if it cannot be listed.
+    """
+    try:
+        with os.scandir(path) as it:
+            return {e.name for e in it if is_kind(e)}
+    except OSError:
+        return set()
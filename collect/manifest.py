@@ -0,0 +1,131 @@
+"""
+Manifest of what collect has generated under an output path: for every submission, the size, mtime and hash of the
+source it was generated from and the paths of its outputs (.oln.txt, HTML and PDF). An incremental run uses it to
+rebuild only the submissions that are new, have changed, or are missing any of their outputs.
+
+The manifest as a whole is tied to the configuration the outputs depend on (PDF options and renderer) and to the
+source of the collector itself, so changing either rebuilds everything.
+"""
+
+import os, json, hashlib, tempfile
+
+_manifest_name = '.collect-manifest.json'
+_manifest_format = 1
+
+# modules whose source decides what gets generated out of a submission
+_collector_modules = ['collect.py', 'converter.py', 'render.py']
+
+
+class Manifest:
+
+    def __init__(self, path, config_digest, entries=None):
+        """
+        :param path: path of the manifest file.
+        :param config_digest: digest of the configuration the outputs are generated with (see get_config_digest).
+        :param entries: per source path, a dict with its 'mtime_ns', 'size', 'sha256' and 'outputs'.
+        """
+        self.path = path
+        self.config_digest = config_digest
+        self.entries = entries if entries else {}
+
+    @staticmethod
+    def load(output_path, config_digest):
+        """
+        :return: the manifest of the given output path; empty if there is none yet, or if it was written
+                 for a different configuration.
+        """
+        path = os.path.join(output_path, _manifest_name)
+        try:
+            with open(path, encoding='UTF-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return Manifest(path, config_digest)
+
+        if manifest.get('format') != _manifest_format or manifest.get('config') != config_digest:
+            return Manifest(path, config_digest)
+
+        return Manifest(path, config_digest, manifest['entries'])
+
+    def is_current(self, source_path, outputs):
+        """
+        :return: whether the outputs of the given source exist and were generated from its current contents.
+        """
+        entry = self.entries.get(source_path)
+        if not entry or entry['outputs'] != outputs or not all(os.path.isfile(p) for p in outputs):
+            return False
+
+        try:
+            stat = os.stat(source_path)
+        except OSError:
+            return False
+
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime_ns == entry['mtime_ns']:
+            return True
+
+        # touched, but possibly not changed
+        try:
+            with open(source_path, 'rb') as f:
+                sha256 = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return False
+
+        if sha256 != entry['sha256']:
+            return False
+
+        entry['mtime_ns'] = stat.st_mtime_ns
+        return True
+
+    def record(self, source_path, fingerprint, outputs):
+        """
+        :param fingerprint: (mtime_ns, size, sha256) of the source the outputs were generated from.
+        """
+        mtime_ns, size, sha256 = fingerprint
+        self.entries[source_path] = {'mtime_ns': mtime_ns, 'size': size, 'sha256': sha256, 'outputs': outputs}
+
+    def forget(self, source_path):
+        self.entries.pop(source_path, None)
+
+    def save(self):
+        """
+        Write the manifest out, replacing the previous one at once so that it is never seen half-written.
+        """
+        data = json.dumps({'format': _manifest_format, 'config': self.config_digest, 'entries': self.entries},
+                          indent=1, sort_keys=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.', prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w', encoding='UTF-8') as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+
+def get_fingerprint(source_file, data):
+    """
+    :param source_file: the source, opened in binary mode.
+    :param data: all of its contents, as read from source_file.
+    :return: (mtime_ns, size, sha256) of the source.
+    """
+    stat = os.fstat(source_file.fileno())
+    return stat.st_mtime_ns, len(data), hashlib.sha256(data).hexdigest()
+
+
+def get_config_digest(config, stylesheet_digest):
+    """
+    :param config: CollectConfig.
+    :param stylesheet_digest: hex digest of the stylesheet the HTML files link to (see pdfcache.get_file_digest).
+    :return: digest of the configuration, the stylesheet and the collector source the generated outputs depend on.
+    """
+    h = hashlib.sha256(json.dumps({'pdf_config': config.pdf_config, 'pdf_renderer': config.pdf_renderer,
+                                   'stylesheet': stylesheet_digest}, sort_keys=True).encode())
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in _collector_modules:
+        with open(os.path.join(here, name), 'rb') as f:
+            h.update(f.read())
+
+    return h.hexdigest()
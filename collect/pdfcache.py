@@ -0,0 +1,250 @@
+"""
+Content-addressed store of rendered PDFs. Many submissions are byte-identical (untouched starter files, resubmissions)
+or turn into identical HTML once preprocessed; rather than rendering each of them again, the PDF rendered for the same
+HTML, stylesheet and renderer command line is hardlinked (or, across file systems, copied) into place.
+
+Entries are evicted least recently used first once the store grows beyond its size limit. Hits and misses are
+counted in the store itself; run this module to print them.
+
+Usage: python3 pdfcache.py [cache_dir]
+"""
+
+import os, sys, json, fcntl, shutil, hashlib, tempfile
+
+_default_cache_dir = os.path.join('~', '.cache', 'collect', 'pdf')
+_size_limit = 512 * 1024 * 1024  # bytes; least recently used entries are evicted beyond this
+_entry_suffix = '.pdf'
+_stats_name = 'stats.json'
+_cache_format = 1
+
+
+class PdfCache:
+    """
+    Directory of rendered PDFs, one file per entry, named after its key. Safe to share between collect runs:
+    entries are linked or copied to a temporary name and renamed into place, and eviction and statistics
+    are serialized through a lock file.
+    """
+
+    def __init__(self, cache_dir, size_limit=_size_limit):
+        self.cache_dir = cache_dir
+        self.size_limit = size_limit
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def open(cache_dir=None):
+        """
+        :param cache_dir: where the cache lives (the current user's by default); an empty string turns it off.
+        :return: the cache, or None if it is turned off or cannot be created.
+        """
+        if cache_dir is None:
+            cache_dir = _default_cache_dir
+        if not cache_dir:
+            return None
+
+        cache_dir = os.path.expanduser(cache_dir)
+        try:
+            os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        except OSError:
+            return None
+
+        return PdfCache(cache_dir)
+
+    @staticmethod
+    def key(renderer_args, stylesheet_digest, html_digest):
+        """
+        :param renderer_args: command line of the renderer, options included.
+        :param stylesheet_digest: hex digest of the stylesheet the HTML links to (see get_file_digest).
+        :param html_digest: hex digest of the HTML (see get_digest).
+        :return: hex digest identifying the rendered PDF.
+        """
+        h = hashlib.sha256()
+        h.update('{}\0{}\0{}\0{}\0'.format(_cache_format, json.dumps(renderer_args), stylesheet_digest,
+                                           html_digest).encode())
+        return h.hexdigest()
+
+    def fetch(self, key, pdf_path):
+        """
+        Put the PDF stored under the key at the given path, replacing whatever is there.
+        :return: whether it was there to put.
+        """
+        entry_path = self.get_entry_path(key)
+        try:
+            place(entry_path, pdf_path)
+            os.utime(entry_path)  # mark as recently used
+        except OSError:
+            self.misses += 1
+            return False
+
+        self.hits += 1
+        return True
+
+    def add(self, key, pdf_path):
+        """
+        Store the PDF at the given path under the key. Failing to do so is never an error; it simply is not cached.
+        """
+        try:
+            place(pdf_path, self.get_entry_path(key))
+        except OSError:
+            pass
+
+    def close(self):
+        """
+        Fold the hits and misses of this run into the statistics of the cache, then evict whatever does not fit
+        in its size limit anymore. Skipped when another run is already at it.
+        """
+        try:
+            with open(os.path.join(self.cache_dir, '.lock'), 'w') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return
+
+                stats = self.load_stats()
+                stats['hits'] += self.hits
+                stats['misses'] += self.misses
+                stats['evictions'] += self.evict()
+                self.store_stats(stats)
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in its size limit again; the caller holds the lock.
+        :return: number of entries removed.
+        """
+        entries, total_size = self.scan()
+        if total_size <= self.size_limit:
+            return 0
+
+        removed = 0
+        for mtime, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            removed += 1
+            total_size -= size
+            if total_size <= self.size_limit:
+                break
+
+        return removed
+
+    def scan(self):
+        """
+        :return: (mtime, size, path) of every entry, and their total size.
+        """
+        entries = []
+        total_size = 0
+        with os.scandir(self.cache_dir) as it:
+            for e in it:
+                if e.name.endswith(_entry_suffix) and not e.name.startswith('.'):
+                    stat = e.stat()
+                    entries.append((stat.st_mtime, stat.st_size, e.path))
+                    total_size += stat.st_size
+
+        return entries, total_size
+
+    def load_stats(self):
+        stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        try:
+            with open(os.path.join(self.cache_dir, _stats_name)) as f:
+                stats.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+        return stats
+
+    def store_stats(self, stats):
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(stats, f)
+            os.replace(temp_path, os.path.join(self.cache_dir, _stats_name))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def get_entry_path(self, key):
+        return os.path.join(self.cache_dir, key + _entry_suffix)
+
+
+def place(source_path, target_path):
+    """
+    Hardlink the source file at the target path, or copy it there if it cannot be linked, replacing the target
+    at once so that it is never seen half-written.
+    """
+    if os.path.exists(target_path) and os.path.samefile(source_path, target_path):
+        return  # renaming a link onto another link of the same file would leave the temporary one behind
+
+    temp_path = os.path.join(os.path.dirname(target_path) or '.',
+                             '.tmp-{:d}-{}'.format(os.getpid(), os.path.basename(target_path)))
+    try:
+        try:
+            os.link(source_path, temp_path)
+        except FileExistsError:
+            os.remove(temp_path)
+            os.link(source_path, temp_path)
+    except OSError:
+        if not os.path.isfile(source_path):
+            raise
+        shutil.copyfile(source_path, temp_path)
+
+    try:
+        os.replace(temp_path, target_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def detach(path):
+    """
+    Give the file at the given path its own copy of its contents if it is a hardlink, so that writing to it
+    (as the renderer does) cannot change the entry of the cache it shares its contents with.
+    """
+    try:
+        if os.stat(path).st_nlink > 1:
+            temp_path = os.path.join(os.path.dirname(path) or '.', '.tmp-{:d}-{}'.format(os.getpid(),
+                                                                                         os.path.basename(path)))
+            shutil.copyfile(path, temp_path)
+            os.replace(temp_path, path)
+    except OSError:
+        pass
+
+
+def get_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_file_digest(path):
+    """
+    :return: hex digest of the contents of the file at the given path, or of nothing if there is no such file.
+    """
+    try:
+        with open(path, 'rb') as f:
+            return get_digest(f.read())
+    except OSError:
+        return get_digest(b'')
+
+
+def main(args):
+    cache = PdfCache.open(args[0] if args else None)
+    if not cache:
+        print('No PDF cache at {}'.format(args[0] if args else _default_cache_dir), file=sys.stderr)
+        exit(1)
+
+    stats = cache.load_stats()
+    entries, total_size = cache.scan()
+    lookups = stats['hits'] + stats['misses']
+
+    print('PDF cache: {}'.format(cache.cache_dir))
+    print('  entries   {:d} ({:.1f} of {:.0f} MiB)'.format(len(entries), total_size / 2 ** 20,
+                                                         cache.size_limit / 2 ** 20))
+    print('  hits      {:d}'.format(stats['hits']))
+    print('  misses    {:d}'.format(stats['misses']))
+    print('  hit rate  {}'.format('{:.1%}'.format(stats['hits'] / lookups) if lookups else '-'))
+    print('  evicted   {:d}'.format(stats['evictions']))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,127 @@
+"""
+Batched HTML to PDF rendering: rather than starting wkhtmltopdf once for every file (as pdfkit.from_file does),
+a single renderer process converts a whole batch of files, reading the input and output path of each conversion
+from its standard input (wkhtmltopdf --read-args-from-stdin).
+"""
+
+import os, subprocess
+
+_default_renderer = 'wkhtmltopdf'
+_default_batch_size = 50  # conversions per renderer process
+
+
+class PdfRenderer:
+    """
+    Renders HTML files to PDF in batches. Any program understanding the command line of wkhtmltopdf, including
+    --read-args-from-stdin (one conversion per line of standard input), can stand in for it.
+    """
+
+    def __init__(self, options=None, renderer=None, batch_size=_default_batch_size):
+        """
+        :param options: wkhtmltopdf options, as for pdfkit, i.e. {'page-size': 'Letter', 'quiet': ''}.
+        :param renderer: path to the renderer executable; wkhtmltopdf on the PATH by default.
+        :param batch_size: maximum number of files converted by a single renderer process.
+        """
+        self.args = [renderer or _default_renderer] + get_option_args(options or {}) + ['--read-args-from-stdin']
+        self.batch_size = batch_size
+
+    def render(self, jobs):
+        """
+        :param jobs: list of (html_path, pdf_path) pairs to convert.
+        :return: list telling for each job whether its PDF has been written.
+        """
+        results = []
+        for start in range(0, len(jobs), self.batch_size):
+            results.extend(self.render_batch(jobs[start:start + self.batch_size]))
+        return results
+
+    def render_batch(self, jobs):
+        before = [get_mtime(pdf_path) for html_path, pdf_path in jobs]
+        lines = [get_stdin_line(html_path, pdf_path) for html_path, pdf_path in jobs]
+
+        try:
+            proc = subprocess.run(self.args, input=''.join(l for l in lines if l).encode(),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError:
+            return [False] * len(jobs)
+
+        results = [bool(line) and is_written(pdf_path, mtime)
+                   for line, (html_path, pdf_path), mtime in zip(lines, jobs, before)]
+
+        if proc.returncode != 0 and len(jobs) > 1 and not all(results):
+            # the renderer may have given up halfway through; give whatever it did not get to another chance, one by one
+            for ndx, result in enumerate(results):
+                if not result:
+                    results[ndx] = self.render_batch([jobs[ndx]])[0]
+
+        return results
+
+
+def get_option_args(options, verbose=False):
+    """
+    Turn options into command line arguments the same way pdfkit (1.0) does, so that pdf_config means the same
+    thing it did with pdfkit.from_file:
+        - keys are lowercased, and prefixed with '--' unless they already contain it;
+        - a list or tuple value repeats the option once per item, an item that is itself a pair of values
+          (i.e. a cookie name and value) following the option as two arguments;
+        - empty (or false) values, and booleans, leave the option as a flag;
+        - --quiet is added unless verbose, as pdfkit.from_file does by default.
+    :raise ValueError: if an item of a list value is a list but not a pair of non-empty values.
+    """
+    options = dict(options)
+    if not verbose:
+        options['--quiet'] = ''
+
+    args = []
+    for key, value in options.items():
+        key = key.lower() if '--' in key else '--' + key.lower()
+
+        if isinstance(value, (list, tuple)):
+            items = value
+        else:
+            items = ['' if isinstance(value, bool) else value]
+
+        for item in items:
+            args.append(key)
+            if isinstance(item, (list, tuple)):
+                if len(item) != 2 or not item[0] or not item[1]:
+                    raise ValueError('Option value can only be either a string or a (tuple, list) of 2 items')
+                args.extend(str(v) for v in item)
+            elif item:
+                args.append(str(item))
+
+    return args
+
+
+def get_stdin_line(html_path, pdf_path):
+    """
+    :return: line of arguments for a single conversion, or None if the paths cannot be passed on a single line.
+    """
+    if any(c in path for path in (html_path, pdf_path) for c in '\n\r\0'):
+        return None
+
+    return '{} {}\n'.format(quote(html_path), quote(pdf_path))
+
+
+def quote(arg):
+    # wkhtmltopdf splits lines read from stdin on whitespace, honoring double quotes and backslash escapes
+    return '"' + arg.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def get_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def is_written(path, mtime_before):
+    """
+    :return: whether the file at the given path is non-empty and has been (re)written since mtime_before.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+
+    return stat.st_size > 0 and stat.st_mtime_ns != mtime_before
@@ -0,0 +1,82 @@
+"""
+Optional trace of a collect run, in the same JSON lines format as the trace of DRCOP (see processors/instrument.py):
+a record per file collected, with the wall and CPU time of each stage it went through in a worker process, and a
+record per PDF batch, with the wall time the renderer took over it (its CPU time is spent in another process).
+
+Turned on by --trace, or by the DRCOP_TRACE environment variable, set to 1 to trace into the output directory or to
+the path of the trace file.
+"""
+
+import os, sys, json, time
+
+# the stage timers and trace file writing of DRCOP's own trace
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'processors'))
+
+from tracefile import Stage, no_stage, dump_stages, append_line
+
+_trace_env = 'DRCOP_TRACE'
+_trace_name = 'collect-trace.jsonl'
+
+
+class Trace:
+    """
+    Trace file records are appended to, each in a single write so that records never interleave.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def open(requested, output_path):
+        """
+        :param requested: whether --trace was given.
+        :return: Trace, or None if tracing is off.
+        """
+        value = os.environ.get(_trace_env, '')
+        if value not in ('', '0', '1'):
+            return Trace(value)
+        if requested or value == '1':
+            return Trace(os.path.join(output_path, _trace_name))
+        return None
+
+    def record(self, **fields):
+        """
+        Tracing must never get in the way of collecting: a record that cannot be written is lost (see tracefile).
+        """
+        record = {'time': round(time.time(), 3), 'pid': os.getpid(), 'program': 'collect'}
+        record.update(fields)
+        append_line(self.path, json.dumps(record))
+
+
+class StageTimes:
+    """
+    Wall and CPU time of the stages of a single file, as recorded in the trace.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def stage(self, name):
+        return Stage(self.stages, name)
+
+    def to_dict(self):
+        return dump_stages(self.stages)
+
+
+class NoStageTimes:
+    """
+    Stands in for StageTimes while not tracing.
+    """
+
+    def stage(self, name):
+        return no_stage
+
+    def to_dict(self):
+        return None
+
+
+_no_stage_times = NoStageTimes()
+
+
+def get_stage_times(tracing):
+    return StageTimes() if tracing else _no_stage_times
@@ -0,0 +1,183 @@
+"""
+Atomic output files. Generated files and error logs are written under a temporary name next to where they belong,
+flushed to disk, and only then renamed into place, so that no one (another DRCOP run, a batch worker, the student)
+ever sees one half-written, and a failure halfway leaves whatever was there before untouched.
+
+Writes are coalesced in a large buffer, so that a whole generated file normally reaches the file system in a single
+write. The directories files are renamed into can be synced once for a whole run rather than once per file.
+"""
+
+import os, tempfile
+
+_buffer_size = 1024 * 1024  # bytes; generated files rarely come anywhere close
+
+# permissions of newly created files, as open() would have created them
+_umask = os.umask(0)
+os.umask(_umask)
+
+
+class AtomicFile:
+    """
+    File written under a temporary name and renamed into place when committed. Used as a context manager,
+    it is committed on leaving the block, unless the block raises or it has been discarded.
+    """
+
+    def __init__(self, path, pending_dirs=None):
+        """
+        :param pending_dirs: DirectorySync to leave syncing the directory of the file to; synced on commit if None.
+        """
+        self.path = path
+        self.pending_dirs = pending_dirs
+        self.done = False
+
+        fd, self.temp_path = tempfile.mkstemp(dir=get_dir(path), prefix='.{}.tmp-'.format(os.path.basename(path)))
+        try:
+            os.fchmod(fd, get_mode(path))
+            self.file = os.fdopen(fd, 'w', buffering=_buffer_size)
+        except BaseException:
+            os.close(fd)
+            os.remove(self.temp_path)
+            raise
+
+    def write(self, s):
+        return self.file.write(s)
+
+    def commit(self):
+        """
+        Flush the contents to disk and put the file in place, replacing whatever was there.
+        """
+        if self.done:
+            return
+        self.done = True
+
+        try:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            os.replace(self.temp_path, self.path)
+        except BaseException:
+            self.file.close()
+            remove_quietly(self.temp_path)
+            raise
+
+        if self.pending_dirs is None:
+            sync_dir(get_dir(self.path))
+        else:
+            self.pending_dirs.add(get_dir(self.path))
+
+    def discard(self):
+        """
+        Throw away whatever has been written, leaving the file at the path as it was.
+        """
+        if self.done:
+            return
+        self.done = True
+
+        try:
+            self.file.close()
+        except OSError:
+            pass
+        remove_quietly(self.temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self.discard()
+        else:
+            self.commit()
+
+
+class DirectorySync:
+    """
+    Directories files have been renamed into, to be synced all at once (and each of them only once).
+    """
+
+    def __init__(self):
+        self.dirs = set()
+
+    def add(self, path):
+        self.dirs.add(path)
+
+    def sync(self):
+        for path in self.dirs:
+            sync_dir(path)
+        self.dirs.clear()
+
+
+def write_unique(dir_path, stem, suffix, contents):
+    """
+    Write a new file into the directory, named after the stem unless a file of that name exists already,
+    in which case a counter is appended to the stem. Never replaces another file, however many processes
+    write under the same stem at once.
+    :return: the stem the file has been written under, i.e. '123' or '123-2'.
+    """
+    with AtomicFile(os.path.join(dir_path, stem + suffix)) as f:
+        f.write(contents)
+        f.file.flush()
+        os.fsync(f.file.fileno())
+
+        # link the complete file to the first free name, rather than renaming it over whatever is there
+        count = 1
+        unique_stem = stem
+        while True:
+            try:
+                os.link(f.temp_path, os.path.join(dir_path, unique_stem + suffix))
+                break
+            except FileExistsError:
+                count += 1
+                unique_stem = '{}-{:d}'.format(stem, count)
+
+        f.discard()
+
+    sync_dir(dir_path)
+    return unique_stem
+
+
+def get_dir(path):
+    return os.path.dirname(path) or '.'
+
+
+def set_umask(umask):
+    """
+    Set the umask of the current process, and the permissions files are created with accordingly; for the
+    DRCOP daemon, whose workers create files on behalf of clients each with a umask of their own.
+    """
+    global _umask
+    os.umask(umask)
+    _umask = umask
+
+
+def get_mode(path):
+    """
+    :return: permissions for the file at the given path: those of the file being replaced, if any.
+    """
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except OSError:
+        return 0o666 & ~_umask
+
+
+def sync_dir(path):
+    """
+    Make the renames within the directory durable. Not every platform or file system allows it; that is no error.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+"""
+Batch mode for DRCOP: compile every code outline found under the given directories or glob patterns
+in a single interpreter (or a pool of worker processes), without prompting, and finish with a per-file summary.
+"""
+
+import sys, os, glob, argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import process
+import instrument
+from diagnostics import DiagnosticsChannel, ParseError
+from atomic import DirectorySync
+
+_oln_suffix = '.oln.py'
+
+# parser owned by the current (worker) process, reused for every code outline it compiles
+_parser = None
+
+
+class Result:
+    """
+    Outcome of compiling a single code outline in a batch.
+    """
+
+    OK = 'OK'
+    SKIPPED = 'SKIPPED'
+    FAILED = 'FAILED'
+
+    def __init__(self, input_path, status, written=0, reason=None):
+        self.input_path = input_path
+        self.status = status
+        self.written = written
+        self.reason = reason
+
+    def __str__(self):
+        details = self.reason if self.reason else '{:d} file(s) written'.format(self.written)
+        return '  {:<8}{}  ({})'.format(self.status, self.input_path, details)
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser(
+        prog='batch.py', description='Generate templates and unittests for many code outlines at once.')
+    arg_parser.add_argument('inputs', nargs='+', metavar='path',
+                            help='.oln.py file, directory to search recursively, or glob pattern')
+    arg_parser.add_argument('-o', '--output', metavar='dir',
+                            help='directory to write into (default: next to each code outline)')
+    arg_parser.add_argument('--overwrite', choices=['always', 'never'], default='never',
+                            help='what to do with generated files that already exist (default: never)')
+    arg_parser.add_argument('-j', '--jobs', type=int, default=1, metavar='n',
+                            help='number of worker processes to compile with (default: 1)')
+    arg_parser.add_argument('--trace', action='store_true',
+                            help='append the time each code outline took, stage by stage, to the trace file '
+                                 '(as does setting DRCOP_TRACE)')
+    arg_parser.add_argument('--debug', action='store_true', help='re-raise unexpected exceptions')
+    options = arg_parser.parse_args(args)
+
+    if options.output and not os.path.isdir(options.output):
+        print('Invalid output directory path given:', options.output, file=sys.stderr)
+        return 1
+
+    input_paths = find_outlines(options.inputs)
+    if not input_paths:
+        print('No code outline (*{}) found.'.format(_oln_suffix), file=sys.stderr)
+        return 1
+
+    overwrite = options.overwrite == 'always'
+    planned = []
+    claimed = set()
+
+    for path in input_paths:
+        if not path.endswith(_oln_suffix):
+            # only named explicitly; its template would be named after a garbled version of its name
+            planned.append(Result(path, Result.SKIPPED, reason='name does not end with "{}"'.format(_oln_suffix)))
+            continue
+
+        template_name = process.parse_input_path(path)[1]
+        if options.output and template_name in claimed:
+            # same file name from different directories would end up on top of each other
+            planned.append(Result(path, Result.FAILED, reason='output clashes with an earlier code outline'))
+        else:
+            claimed.add(template_name)
+            planned.append((path, options.output, overwrite, options.debug))
+
+    tasks = [p for p in planned if not isinstance(p, Result)]
+    results = []
+    trace_path = instrument.get_trace_path() if options.trace or instrument.is_requested() else None
+
+    if options.jobs > 1:
+        with ProcessPoolExecutor(max_workers=options.jobs, initializer=init_worker, initargs=(trace_path,)) as pool:
+            outcomes = pool.map(compile_outline_drained, tasks)
+            for p in planned:
+                if isinstance(p, Result):
+                    results.append(p)
+                else:
+                    result, entries = next(outcomes)
+                    DiagnosticsChannel(entries).flush()
+                    results.append(result)
+    else:
+        init_worker(trace_path)
+        for p in planned:
+            results.append(p if isinstance(p, Result) else compile_outline(*p))
+            process._channel.flush()
+
+    # every file has been renamed into place as soon as it was complete; their directories are synced once, here
+    pending_dirs = DirectorySync()
+    for r in results:
+        if r.written:
+            pending_dirs.add(options.output or process.parse_input_path(r.input_path)[0])
+    pending_dirs.sync()
+
+    print_summary(results)
+    return 0 if all(r.status != Result.FAILED for r in results) else 1
+
+
+def find_outlines(inputs):
+    """
+    Expand the inputs given on the command line into a list of code outline paths, in a stable order.
+    :param inputs: paths to .oln.py files, directories (searched recursively) or glob patterns.
+    :return: list of unique paths, in the order they were given; files named explicitly are in it whatever their name.
+    """
+    found = []
+    for given in inputs:
+        if os.path.isdir(given):
+            for dir_path, dir_names, file_names in os.walk(given):
+                dir_names.sort()
+                found.extend(os.path.join(dir_path, name) for name in sorted(file_names) if name.endswith(_oln_suffix))
+        elif os.path.isfile(given):
+            found.append(given)
+        else:
+            found.extend(path for path in sorted(glob.glob(given, recursive=True)) if path.endswith(_oln_suffix))
+
+    return list(dict.fromkeys(found))
+
+
+def init_worker(trace_path=None):
+    """
+    :param trace_path: trace file to append a record of every code outline compiled to, if tracing.
+    """
+    global _parser
+    if trace_path:
+        instrument.start('batch', trace_path)
+    _parser = process.new_parser()
+
+
+def compile_outline(input_path, output_dir, overwrite, debug=False):
+    """
+    Parse a single code outline and write its template and unittest file, never prompting the user.
+    Failures (including critical parse errors) are caught and reported in the result.
+    """
+    process._logdata.clear()
+    process._logdata['input_path'] = input_path
+
+    process._channel.info('Compiling \'{}\''.format(input_path))
+    result = get_result(input_path, output_dir, overwrite, debug)
+    instrument.record(file=input_path, status=result.status)
+    return result
+
+
+def get_result(input_path, output_dir, overwrite, debug):
+    """
+    :return: Result of compiling the code outline, as done by compile_outline().
+    """
+    try:
+        path_dir, template_name = process.parse_input_path(input_path)
+        process._logdata['output_path_dir'] = path_dir
+
+        written = process.stream_outputs(input_path, output_dir or path_dir, template_name, overwrite, _parser,
+                                         DirectorySync())  # synced by main() instead
+    except ParseError:
+        return Result(input_path, Result.FAILED, reason='critical parse error')
+    except Exception as e:
+        if debug:
+            raise e
+        return Result(input_path, Result.FAILED, reason='{}: {}'.format(type(e).__name__, e))
+
+    return Result(input_path, Result.OK if written else Result.SKIPPED, written)
+
+
+def compile_outline_drained(task):
+    """
+    compile_outline() for a pool worker: parse errors and messages are handed back instead of printed,
+    so that the parent can flush those of every code outline in input order instead of interleaving them.
+    :return: the result and the drained DiagnosticsChannel entries.
+    """
+    result = compile_outline(*task)
+    return result, process._channel.drain()
+
+
+def print_summary(results):
+    counts = {status: 0 for status in (Result.OK, Result.SKIPPED, Result.FAILED)}
+    for r in results:
+        counts[r.status] += 1
+
+    print('\nSummary: {:d} compiled, {:d} skipped, {:d} failed'.format(
+        counts[Result.OK], counts[Result.SKIPPED], counts[Result.FAILED]))
+    for r in results:
+        print(str(r))
+
+
+if __name__ == '__main__':
+    exit(main(sys.argv[1:]))
@@ -0,0 +1,227 @@
+"""
+On-disk cache of generated templates and unittest files, so that re-running DRCOP on a code outline that has not
+changed takes the generated files from disk instead of parsing and generating them all over again.
+
+Entries are keyed by a hash of the code outline, the parser configuration, the template name and the version of the
+code generating them (the source of the parser and the writers), so any change to either invalidates them on its own.
+"""
+
+import os, sys, json, fcntl, hashlib, tempfile
+
+from diagnostics import dump_entries, load_entries
+
+# DRCOP_CACHE_DIR overrides where the cache lives; set it to an empty string to turn the cache off
+_cache_dir_env = 'DRCOP_CACHE_DIR'
+_default_cache_dir = os.path.join('~', '.cache', 'drcop')
+
+_size_limit = 64 * 1024 * 1024  # bytes; least recently used entries are evicted beyond this
+_entry_suffix = '.json'
+_cache_format = 1
+
+# modules whose source decides what gets generated out of a code outline, how it is read, and how it is cached
+_generator_modules = ['parser.py', 'function.py', 'type_registry.py', 'writer.py', 'python_writer.py',
+                      'incremental.py', 'diagnostics.py', 'reader.py']
+
+
+class CachedOutputs:
+    """
+    Generated template and unittest file contents, along with the diagnostics reported while generating them.
+    Stands in for a Writer wherever the contents are to be written out.
+    """
+
+    def __init__(self, template, unittest, diagnostics):
+        """
+        :param diagnostics: (is_error, text) entries of the DiagnosticsChannel reported while parsing, parse errors
+                            being Diagnostics.
+        """
+        self.template = template
+        self.unittest = unittest
+        self.diagnostics = diagnostics
+
+    def write_template(self, file):
+        try:
+            file.write(self.template)
+        except IOError:
+            return False
+
+        return True
+
+    def write_unittest(self, file):
+        try:
+            file.write(self.unittest)
+        except IOError:
+            return False
+
+        return True
+
+    def to_json(self):
+        return json.dumps({'format': _cache_format, 'template': self.template, 'unittest': self.unittest,
+                           'diagnostics': dump_entries(self.diagnostics)})
+
+    @staticmethod
+    def from_json(data):
+        entry = json.loads(data)
+        if entry.get('format') != _cache_format:
+            return None
+
+        return CachedOutputs(entry['template'], entry['unittest'], load_entries(entry['diagnostics']))
+
+
+class OutputCache:
+    """
+    Directory of CachedOutputs, one file per entry. Safe to share between any number of DRCOP processes:
+    entries are written to a temporary file and renamed into place, so readers never see one half-written,
+    and eviction is serialized through a lock file.
+    """
+
+    def __init__(self, cache_dir, size_limit=_size_limit):
+        self.cache_dir = cache_dir
+        self.size_limit = size_limit
+
+    @staticmethod
+    def open_default():
+        """
+        The environment is looked up on every call rather than once, as the DRCOP daemon serves many runs.
+        :return: the cache of the current user, or None if it is turned off or cannot be created.
+        """
+        cache_dir = os.environ.get(_cache_dir_env, _default_cache_dir)
+        if not cache_dir:
+            return None
+
+        cache_dir = os.path.expanduser(cache_dir)
+        try:
+            os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        except OSError:
+            return None
+
+        return OutputCache(cache_dir)
+
+    @staticmethod
+    def key(outline, config, template_name):
+        """
+        :param outline: contents of the code outline, as bytes (or any buffer, i.e. an mmap).
+        :param config: parser configuration; anything JSON serializable.
+        :param template_name: name the generated files are written under (the unittest file imports it).
+        :return: hex digest identifying the generated outputs.
+        """
+        return get_digest('outputs', config, template_name, outline)
+
+    @staticmethod
+    def index_key(input_path, config, template_name):
+        """
+        :return: hex digest identifying the incremental index of the code outline at the given path.
+        """
+        return get_digest('index', config, template_name, os.fsencode(os.path.abspath(input_path)))
+
+    def get(self, key):
+        """
+        :return: the CachedOutputs stored under the key, or None on a miss.
+        """
+        data = self.load(key)
+        if data is None:
+            return None
+
+        try:
+            return CachedOutputs.from_json(data)
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def put(self, key, outputs):
+        """
+        Store the outputs under the key, evicting least recently used entries if the cache has grown too large.
+        """
+        self.store(key, outputs.to_json())
+
+    def load(self, key):
+        """
+        :return: the JSON stored under the key, or None on a miss.
+        """
+        entry_path = self.get_entry_path(key)
+        try:
+            with open(entry_path) as f:
+                data = f.read()
+            os.utime(entry_path)  # mark as recently used
+        except OSError:
+            return None
+
+        return data
+
+    def store(self, key, data):
+        """
+        Store JSON under the key, evicting least recently used entries if the cache has grown too large.
+        Failing to do so is never an error; the data simply is not cached.
+        """
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(data)
+                os.replace(temp_path, self.get_entry_path(key))
+            except BaseException:
+                os.remove(temp_path)
+                raise
+
+            self.evict()
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in its size limit again.
+        Skipped when another process is already evicting.
+        """
+        with open(os.path.join(self.cache_dir, '.lock'), 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return
+
+            entries = []
+            total_size = 0
+            with os.scandir(self.cache_dir) as it:
+                for e in it:
+                    if e.name.endswith(_entry_suffix):
+                        stat = e.stat()
+                        entries.append((stat.st_mtime, stat.st_size, e.path))
+                        total_size += stat.st_size
+
+            if total_size <= self.size_limit:
+                return
+
+            for mtime, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total_size -= size
+                if total_size <= self.size_limit:
+                    break
+
+    def get_entry_path(self, key):
+        return os.path.join(self.cache_dir, key + _entry_suffix)
+
+
+def get_digest(kind, config, template_name, data):
+    h = hashlib.sha256()
+    h.update('{}\0{}\0{}\0{}\0{}\0'.format(kind, _cache_format, _generator_digest,
+                                             json.dumps(config, sort_keys=True), template_name).encode())
+    h.update(data)
+    return h.hexdigest()
+
+
+def get_generator_digest():
+    """
+    :return: digest of the source of the modules generating outputs, as they are on disk.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha256(sys.version.encode())
+    for name in _generator_modules:
+        with open(os.path.join(here, name), 'rb') as f:
+            h.update(f.read())
+
+    return h.hexdigest()
+
+
+# computed once, along with the imports of the generator modules (a long-lived DRCOP daemon keeps running the code it
+# imported on startup, whatever becomes of the source since), so that keys describe the code producing the entries
+_generator_digest = get_generator_digest()
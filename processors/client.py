@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+"""
+Thin client for the DRCOP daemon (see daemon.py).
+
+Hands the working directory, umask, arguments, environment and standard streams of this process over to a warm daemon
+through a Unix socket, then exits with whatever status the daemon reports back. When no daemon is reachable, one is
+started in the background for the next run and this run falls back to executing process.py directly.
+
+Deliberately imports as little as possible: interpreter start-up of this script is the cost every run still pays.
+"""
+
+import os, sys, stat, socket, signal, struct
+
+_header = struct.Struct('!I')  # length of the request payload
+_status = struct.Struct('!i')  # pid of the worker, then its exit status
+
+_here = os.path.dirname(os.path.abspath(__file__))
+
+
+def socket_path():
+    """
+    One daemon per user, so generated files keep being written with the privileges of the student running DRCOP.
+    :return: path of the Unix socket the daemon of the current user listens on.
+    :raise OSError: if there is no runtime directory only the current user can get at (see runtime_dir).
+    """
+    return os.environ.get('DRCOP_SOCKET') or os.path.join(runtime_dir(), 'drcop.sock')
+
+
+def runtime_dir():
+    """
+    The socket (and the lock of the daemon) live in a directory no one but the current user can get at, so that no
+    other user on a shared lab machine can listen in their place: $XDG_RUNTIME_DIR where there is one, and otherwise
+    a directory of their own created under the temporary directory.
+    :return: path of the runtime directory of the current user.
+    :raise OSError: if the directory is not a directory, is owned by another user, or is open to other users.
+    """
+    path = os.environ.get('XDG_RUNTIME_DIR')
+    if not path:
+        path = os.path.join(os.environ.get('TMPDIR', '/tmp'), 'drcop-{:d}'.format(os.getuid()))
+        try:
+            os.mkdir(path, 0o700)
+        except FileExistsError:
+            pass
+
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError('DRCOP runtime directory {} is not private to the current user.'.format(path))
+    return path
+
+
+def is_same_user(sock):
+    """
+    :return: whether the process at the other end of the connected Unix socket runs as the current user;
+             always True where the platform cannot tell (the runtime directory is private either way).
+    """
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return True
+
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    pid, uid, gid = struct.unpack('3i', creds)
+    return uid == os.getuid()
+
+
+def get_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def encode_request(args):
+    """
+    Request payload: cwd, umask (octal), argument count, arguments, then environment entries; NUL-separated.
+    """
+    fields = [os.getcwd(), '{:o}'.format(get_umask()), str(len(args))] + list(args)
+    fields += ['{}={}'.format(k, v) for k, v in os.environ.items()]
+    payload = b'\0'.join(os.fsencode(f) for f in fields)
+    return _header.pack(len(payload)) + payload
+
+
+def decode_request(data):
+    fields = [os.fsdecode(f) for f in data.split(b'\0')]
+    cwd, umask, argc = fields[0], int(fields[1], 8), int(fields[2])
+    args = fields[3:3 + argc]
+    env = dict(entry.split('=', 1) for entry in fields[3 + argc:] if '=' in entry)
+    return cwd, umask, args, env
+
+
+def recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('DRCOP daemon closed the connection unexpectedly.')
+        data += chunk
+    return data
+
+
+def main(args):
+    try:
+        path = socket_path()
+    except OSError:
+        run_locally(args)  # no daemon can be trusted, nor started
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        spawn_daemon()
+        run_locally(args)
+
+    # the terminal and the environment are only ever handed over to a daemon of the same user
+    if not is_same_user(sock):
+        sock.close()
+        run_locally(args)
+
+    socket.send_fds(sock, [encode_request(args)], [0, 1, 2])
+    worker_pid = _status.unpack(recv_exactly(sock, _status.size))[0]
+
+    while True:
+        try:
+            return _status.unpack(recv_exactly(sock, _status.size))[0]
+        except KeyboardInterrupt:
+            # the terminal delivers ^C to this process only; pass it on to the worker serving us
+            os.kill(worker_pid, signal.SIGINT)
+        except ConnectionError as e:
+            print(str(e), file=sys.stderr)
+            return 1
+
+
+def spawn_daemon():
+    """
+    Start a detached daemon (double fork) so that the next run is served warm. Failures are silently ignored.
+    """
+    try:
+        pid = os.fork()
+    except OSError:
+        return
+
+    if pid == 0:
+        try:
+            os.setsid()
+            if os.fork() == 0:
+                devnull = os.open(os.devnull, os.O_RDWR)
+                for fd in (0, 1, 2):
+                    os.dup2(devnull, fd)
+                os.execv(sys.executable, [sys.executable, os.path.join(_here, 'daemon.py')])
+        finally:
+            os._exit(0)
+
+    os.waitpid(pid, 0)
+
+
+def run_locally(args):
+    process = os.path.join(_here, 'process.py')
+    os.execv(sys.executable, [sys.executable, process] + list(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
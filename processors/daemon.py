@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+"""
+Long-lived DRCOP server that keeps the interpreter, the parser and the writers warm between runs.
+
+Listens on a per-user Unix socket (see client.socket_path) and forks a worker for every connection. The client passes
+its own stdin, stdout and stderr along with the request, so the worker talks to the student's terminal directly --
+prompts, parse errors and the 127 error-log path behave exactly as when process.py is run by hand.
+
+The daemon exits after sitting idle for a while; since modules are only imported once, it also has to be restarted
+(or left to time out) to pick up changes made to the processors.
+"""
+
+import os, sys, stat, socket, signal, fcntl, argparse, traceback
+
+import process
+import atomic
+from client import socket_path, is_same_user, decode_request, recv_exactly, _header, _status
+
+_default_idle_timeout = 30 * 60  # seconds
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser(prog='daemon.py', description='Serve DRCOP runs from a warm interpreter.')
+    arg_parser.add_argument('--socket', default=socket_path(), help='path of the Unix socket to listen on')
+    arg_parser.add_argument('--idle-timeout', type=float, default=_default_idle_timeout,
+                            help='seconds without any request before the daemon exits')
+    options = arg_parser.parse_args(args)
+
+    serve(options.socket, options.idle_timeout)
+
+
+def serve(path, idle_timeout):
+    # only one daemon per socket; the lock is released by the kernel whenever this process goes away
+    lock_fd = open_lock(path + '.lock')
+    if lock_fd is None:
+        return
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return
+
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        pass
+    else:
+        if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+            return
+        os.unlink(path)  # left behind by a daemon that did not shut down cleanly
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        listener.bind(path)
+    finally:
+        os.umask(old_umask)
+    listener.listen(64)
+    listener.settimeout(idle_timeout)
+
+    # workers are never waited on; let the kernel reap them
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except socket.timeout:
+                break
+
+            conn.settimeout(None)
+            if not is_same_user(conn):
+                conn.close()
+                continue
+
+            if os.fork() == 0:
+                listener.close()
+                os.close(lock_fd)
+                handle(conn)
+            conn.close()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        listener.close()
+        os.unlink(path)
+
+
+def open_lock(path):
+    """
+    Open (creating it if need be) the lock file of the daemon, never following a symbolic link there.
+    :return: file descriptor of the lock file, or None if it cannot be opened or belongs to another user.
+    """
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW | os.O_CLOEXEC, 0o600)
+    except OSError:
+        return None
+
+    if os.fstat(fd).st_uid != os.getuid():
+        os.close(fd)
+        return None
+    return fd
+
+
+def handle(conn):
+    """
+    Body of a forked worker: serve one DRCOP run for the connected client, report the exit status, never return.
+    """
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    status = 1
+
+    try:
+        data, fds, _, _ = socket.recv_fds(conn, 64 * 1024, 3)
+        if len(data) < _header.size or len(fds) != 3:
+            os._exit(1)
+
+        size = _header.unpack(data[:_header.size])[0]
+        data = data[_header.size:]
+        if len(data) < size:
+            data += recv_exactly(conn, size - len(data))
+        cwd, umask, args, env = decode_request(data)
+
+        conn.sendall(_status.pack(os.getpid()))
+
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        reopen_standard_streams()
+
+        os.chdir(cwd)
+        atomic.set_umask(umask)
+        os.environ.clear()
+        os.environ.update(env)
+        sys.argv = [process.__file__] + args
+
+        status = process.run(sys.argv)
+    except SystemExit as e:
+        status = get_exit_status(e.code)
+    except KeyboardInterrupt:
+        status = 128 + signal.SIGINT
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            conn.sendall(_status.pack(status))
+        finally:
+            os._exit(0)
+
+
+def reopen_standard_streams():
+    """
+    Rebuild sys.stdin/stdout/stderr on top of the file descriptors received from the client,
+    buffered the same way the interpreter would have set them up for a fresh process.
+    """
+    sys.stdin = open(0, 'r', closefd=False)
+    sys.stdout = open(1, 'w', buffering=1 if os.isatty(1) else -1, closefd=False)
+    sys.stderr = open(2, 'w', buffering=1, errors='backslashreplace', closefd=False)
+
+
+def get_exit_status(code):
+    """
+    Mirror how the interpreter turns the argument of exit() into a process exit status.
+    """
+    if code is None:
+        return 0
+    elif isinstance(code, int):
+        return code
+    else:
+        print(code, file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
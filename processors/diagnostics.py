@@ -0,0 +1,188 @@
+import sys
+
+_column_length_limit = 70  # characters of the offending line shown at most
+
+
+class Diagnostic:
+    """
+    A parse error: where it is and what it is about. Kept as such until the channel it was reported on is flushed,
+    and only then rendered into the box drawn around it on the student's terminal.
+    """
+
+    IGNORABLE = 'Ignorable'
+    CRITICAL = 'CRITICAL'
+
+    def __init__(self, line_num, column, message, line, is_critical=False):
+        """
+        :param line_num: number of the offending line.
+        :param column: column within the line the error points at.
+        :param line: offending line of the code outline.
+        """
+        self.line_num = line_num
+        self.column = column
+        self.severity = Diagnostic.CRITICAL if is_critical else Diagnostic.IGNORABLE
+        self.message = message
+        self.content = line.replace('\n', '')
+
+    @property
+    def is_critical(self):
+        return self.severity == Diagnostic.CRITICAL
+
+    def render(self):
+        """
+        :return: the diagnostic as written to stderr, boxed and pointing at the column within the line.
+        """
+        content, location, spaces = condense_content(_column_length_limit, self.content, self.column,
+                                                     '\u2500' * self.column, ' ' * self.column)
+
+        header_start = '\u250C\u2500 {} PARSE ERROR at line {:d}:\n\u2502\n'.format(self.severity, self.line_num)
+        message = '\u2502  {}\n\u2502\n'.format(self.message)
+        content = '\u2502    {}\n'.format(content)
+
+        arrow = '\u2502    {}\u25B2\n'.format(spaces)
+        location = '\u2514\u2500\u2500\u2500\u2500{}{}\n'.format(location, '\u2518')
+
+        return '\n' + header_start + message + content + arrow + location + '\n'
+
+    def to_json(self):
+        return {'line_num': self.line_num, 'column': self.column, 'severity': self.severity,
+                'message': self.message, 'content': self.content}
+
+    @staticmethod
+    def from_json(data):
+        return Diagnostic(data['line_num'], data['column'], data['message'], data['content'],
+                          data['severity'] == Diagnostic.CRITICAL)
+
+
+class ParseError(Exception):
+    """
+    Raised by the parser on a critical parse error, once the diagnostic has been reported on its channel.
+    """
+
+    def __init__(self, diagnostic):
+        super().__init__(diagnostic.message)
+        self.diagnostic = diagnostic
+
+
+class DiagnosticsChannel:
+    """
+    Collects everything DRCOP has to tell the user during a run -- parse errors and warnings meant for stderr,
+    generation messages meant for stdout -- and writes it out in the exact order it was reported.
+
+    Each stream is flushed before switching over to the other one, so stderr and stdout never get mixed up
+    on the student's terminal, no matter how either of them is buffered.
+    """
+
+    def __init__(self, entries=None, autoflush=False):
+        """
+        :param entries: (is_error, text) pairs reported elsewhere, i.e. drained from a channel in a worker process;
+                        the text of a parse error is its Diagnostic, rendered only when flushed.
+        :param autoflush: write every entry out as soon as it is reported instead of buffering it.
+        """
+        self.entries = list(entries) if entries else []
+        self.autoflush = autoflush
+
+    def error(self, message):
+        """
+        Report a message for stderr; a newline is appended as print() would.
+        """
+        self.entries.append((True, message + '\n'))
+        if self.autoflush:
+            self.flush()
+
+    def info(self, message):
+        """
+        Report a message for stdout; a newline is appended as print() would.
+        """
+        self.entries.append((False, message + '\n'))
+        if self.autoflush:
+            self.flush()
+
+    def report(self, diagnostic):
+        """
+        Report a parse error for stderr.
+        """
+        self.entries.append((True, diagnostic))
+        if self.autoflush:
+            self.flush()
+
+    def extend(self, entries):
+        """
+        Report entries drained or recorded elsewhere, as if they had been reported on this channel.
+        """
+        self.entries.extend(entries)
+        if self.autoflush:
+            self.flush()
+
+    def drain(self):
+        """
+        :return: all entries reported so far, leaving the channel empty.
+        """
+        entries = self.entries
+        self.entries = []
+        return entries
+
+    def flush(self):
+        """
+        Write out all entries reported so far, in order. Never raises over a diagnostic that fails to render.
+        """
+        prev_stream = None
+        for is_error, text in self.drain():
+            stream = sys.stderr if is_error else sys.stdout
+            if prev_stream and prev_stream is not stream:
+                prev_stream.flush()
+            stream.write(text if isinstance(text, str) else render_quietly(text))
+            prev_stream = stream
+
+        if prev_stream:
+            prev_stream.flush()
+
+
+def render_quietly(diagnostic):
+    """
+    Channels are flushed on the way out of a failed run; a diagnostic that cannot be drawn must not take the place
+    of whatever made the run fail.
+    :return: the diagnostic rendered, or reduced to its line number and message if it cannot be.
+    """
+    try:
+        return diagnostic.render()
+    except Exception:
+        return '\n{} PARSE ERROR at line {}: {}\n\n'.format(diagnostic.severity, diagnostic.line_num,
+                                                          diagnostic.message)
+
+
+def dump_entries(entries):
+    """
+    :return: the entries of a channel as JSON-serializable lists, diagnostics kept as such.
+    """
+    return [[is_error, text if isinstance(text, str) else text.to_json()] for is_error, text in entries]
+
+
+def load_entries(data):
+    """
+    :param data: entries as returned by dump_entries().
+    :return: the entries, to be reported on a channel.
+    """
+    return [(bool(is_error), text if isinstance(text, str) else Diagnostic.from_json(text)) for is_error, text in data]
+
+
+def condense_content(column_length_limit, content, loc, location, spaces):
+    """
+    Shorten a line too long to be shown in full to the part around the column pointed at.
+    :return: the line, the underline up to the column and the spaces up to the column, shortened alike.
+    """
+    if len(content) > column_length_limit:
+        condense_from = max(0, loc - column_length_limit // 2)
+        condense_to = loc + column_length_limit // 2
+
+        is_head = condense_from > 0
+        is_tail = condense_to < len(content)
+
+        dots_prefix = '... ' if is_head else ''
+        dots_suffix = ' ...' if is_tail else ''
+        content = dots_prefix + content[condense_from:condense_to] + dots_suffix
+
+        spaces = ('    ' if is_head else '') + spaces[condense_from:condense_to]
+        location = ('\u2500\u2500\u2500\u2500' if is_head else '') + location[condense_from:condense_to]
+
+    return content, location, spaces
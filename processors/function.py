@@ -1,9 +1,17 @@
-from pydoc import locate
 from ast import literal_eval
+from collections import namedtuple
+
+# an example of a function: argument values (a list, or None if none were given), the expected return value,
+# and the explanation (the comment at the end of the EXAMPLE line, if any)
+Example = namedtuple('Example', ['args', 'expt', 'expl'])
 
 
 class Function:
 
+    # whole terms' worth of functions may be held in memory at once
+    __slots__ = ('name', 'args_types', 'return_type', 'purpose', 'args_names', 'return_name', 'design_recipe_lines',
+                 'ins', 'outs', 'in_outs_source', 'examples', 'body_outlines', 'line_range')
+
     def __init__(self, name, args, return_type):
         # contract
         self.name = name
@@ -23,12 +31,15 @@ class Function:
         self.outs = None
         self.in_outs_source = []
 
-        # examples
+        # examples (Example records)
         self.examples = []
 
         # body outlines
         self.body_outlines = []
 
+        # first and last line number of the code outline this function was parsed from (set by Parser)
+        self.line_range = None
+
     def validate_completion(self):
         is_valid = True
         reasons = []
@@ -69,21 +80,28 @@ class Function:
 
         example = '\n'
         for ex in self.examples:
-            example += '    # ' + str(ex) + '\n'
+            example += '    # ' + '{}({}) -> {}    ({})'.format(
+                self.name, str(ex.args).lstrip('[').rstrip(']'), str(ex.expt), ex.expl if ex.expl else 'no expl') + '\n'
 
         return header + contract + outline + example
 
 
-class Example:
+class ExampleBuilder:
+    """
+    Casts the values of a single EXAMPLE line to the types in the contract of its function, one at a time,
+    and builds the Example record kept by the function once all of them are in.
+    """
 
-    def __init__(self, function, recognized_primitives):
+    __slots__ = ('fxn', 'args', 'expt', 'expl', 'arity_count', 'types')
+
+    def __init__(self, function, types):
         self.fxn = function
         self.args = None
         self.expt = None
         self.expl = None
 
         self.arity_count = 0
-        self.primitives = recognized_primitives
+        self.types = types  # TypeRegistry shared by all examples
 
     def add_arg(self, arg_val):
         arity = len(self.fxn.args_types)
@@ -112,22 +130,16 @@ class Example:
 
     def eval_value_str(self, val, is_rtrn_val):
         """ Timing at which this function is called when casting argument values matter! (see comment below) """
-        recognized_types = self.primitives
 
         # The line below is the reason for the docstring ^
         # It must be called in arity order or bad things will happen ...
         type = self.fxn.return_type if is_rtrn_val else self.fxn.args_types[self.arity_count]
 
-        try: # safety net for locate() and literal_eval()
+        try: # safety net for casting and literal_eval()
+            cast = self.types.get_caster(type)
             if val == 'None':
                 return None
-            elif type in recognized_types:
-                cast = locate(type)
-
-                # casting str -> bool evals according to 'Truthiness'
-                if cast == bool and val == 'False':
-                    val = ''
-
+            elif cast:
                 return cast(val)
             else:
                 try:
@@ -138,14 +150,5 @@ class Example:
         except ValueError:
             return '____total__and__utter__failure'
 
-    def __str__(self):
-        """
-        Mostly for debugging.
-        :return: String representation of the example.
-        """
-        return '{}({}) -> {}    ({})'.format(
-            self.fxn.name,
-            str(self.args).lstrip('[').rstrip(']'),
-            str(self.expt),
-            self.expl if self.expl else 'no expl'
-        )
+    def build(self):
+        return Example(self.args, self.expt, self.expl)
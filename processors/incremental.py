@@ -0,0 +1,165 @@
+"""
+Incremental compilation of code outlines: only the functions whose part of the code outline changed since the previous
+run are parsed and generated again; everything else is taken from the index that run left behind.
+
+The code outline is cut into blocks by the state machine of the parser alone (see parser.find_function_starts), one
+block per function, starting at its CONTRACT line, plus whatever precedes the first one. Each block is fingerprinted
+together with everything parsing it depends on from the block before: the last line of that block, and the name of
+its function and whether it was complete, since that is reported as the CONTRACT line is parsed. Diagnostics name absolute line
+numbers, so a block that reported any is only reused while it still starts at the same line.
+"""
+
+import json, hashlib
+
+from parser import find_function_starts
+from python_writer import PythonWriter
+from diagnostics import DiagnosticsChannel, dump_entries, load_entries
+from cache import CachedOutputs
+import instrument
+
+_index_format = 1
+
+
+class ReusedFunction:
+    """
+    Stands in for a Function taken from the index, as far as the parser is still concerned with it once it is parsed:
+    to check whether it is complete when the next one starts or the code outline ends.
+    """
+
+    def __init__(self, record):
+        self.name = record['name']
+        self.line_range = tuple(record['line_range'])
+        self.completion = (record['completion'][0], tuple(record['completion'][1]))
+
+    def validate_completion(self):
+        return self.completion
+
+
+def compile_lines(parser, lines, template_name, records=None):
+    """
+    Parse the code outline and generate its template and unittest file contents, reusing what can be reused.
+    Diagnostics are reported on the channel of the parser, in the same order as if everything had been parsed.
+    :param parser: parser to use (it is reset first).
+    :param lines: all lines of the code outline (a list is used as is).
+    :param records: index of the previous run of the same code outline (see load_index), if any.
+    :return: CachedOutputs and the index of this run, to be passed in as records next time.
+    """
+    lines = lines if isinstance(lines, list) else list(lines)
+    writer = PythonWriter([], template_name)
+    reusable = {}
+    for record in records or []:
+        reusable.setdefault(record['fingerprint'], []).append(record)
+
+    starts = find_function_starts(lines)
+    ends = [ndx for ndx, _, _ in starts[1:]] + [len(lines)]
+
+    parser.reset()
+    channel = parser.channel
+
+    # whatever precedes the first function does not build anything, but may well be invalid
+    with instrument.stage('parse'):
+        for line in lines[:starts[0][0] if starts else len(lines)]:
+            parser.parse(line)
+
+    new_records = []
+    prev_record = None
+
+    for (start, primary, sub), end in zip(starts, ends):
+        block = lines[start:end]
+        context = [lines[start - 1] if start else None] + \
+            ([prev_record['name'], prev_record['completion']] if prev_record else [])
+        fingerprint = hashlib.sha1((json.dumps(context) + '\0' + ''.join(block)).encode()).hexdigest()
+
+        record = find_record(reusable.get(fingerprint, []), start + 1)
+        if record:
+            record = dict(record, line_range=[start + 1, end])
+            channel.extend(load_entries(record['diagnostics']))
+
+            # leave the parser as if it had parsed the block itself
+            parser.line_num = end
+            parser.prev_line = lines[end - 2] if end > 1 else None
+            parser.line = lines[end - 1]
+            parser.curr_fx = ReusedFunction(record)
+            instrument.count('functions_reused')
+        else:
+            record = parse_block(parser, block, primary, sub, writer)
+            record['fingerprint'] = fingerprint
+
+        new_records.append(record)
+        prev_record = record
+
+    with instrument.stage('parse'):
+        parser.signal_EOF()
+
+    # every diagnostic has been passed on to the channel by now
+    with instrument.stage('generate'):
+        template = writer.assemble_template(r['template'] for r in new_records)
+        unittest = writer.assemble_unittest(r['unittest'] for r in new_records)
+
+    return CachedOutputs(template, unittest, []), new_records
+
+
+def parse_block(parser, block, primary, sub, writer):
+    """
+    Parse the lines of a single function and generate its part of the template and unittest file.
+    :param primary: primary state the parser is in before the first line of the block.
+    :param sub: sub state the parser is in before the first line of the block.
+    :return: index record of the function.
+    """
+    parser.state.primary, parser.state.sub = primary, sub
+
+    # diagnostics are collected separately to be recorded, and still passed on however parsing ends
+    channel = parser.channel
+    parser.channel = DiagnosticsChannel()
+    try:
+        with instrument.stage('parse'):
+            for line in block:
+                parser.parse(line)
+    finally:
+        diagnostics = parser.channel.drain()
+        parser.channel = channel
+        channel.extend(diagnostics)
+
+    fxn = parser.curr_fx
+    is_complete, reasons = fxn.validate_completion()
+    with instrument.stage('generate'):
+        template = writer.get_template_function(fxn)
+        unittest = writer.get_unittests(fxn)
+
+    return {'name': fxn.name,
+            'line_range': [fxn.line_range[0], fxn.line_range[0] + len(block) - 1],
+            'completion': [is_complete, list(reasons)],
+            'template': template,
+            'unittest': unittest,
+            'diagnostics': dump_entries(diagnostics)}
+
+
+def find_record(candidates, first_line):
+    """
+    :return: the first record among those with a matching fingerprint that can be reused at the given line, if any.
+    """
+    for record in candidates:
+        if not record['diagnostics'] or record['line_range'][0] == first_line:
+            return record
+
+    return None
+
+
+def load_index(data):
+    """
+    :param data: JSON as stored by dump_index(), or None.
+    :return: index records, or None if there are none to be used.
+    """
+    if data is None:
+        return None
+
+    try:
+        index = json.loads(data)
+    except ValueError:
+        return None
+
+    return index['records'] if index.get('format') == _index_format else None
+
+
+def dump_index(records):
+    return json.dumps({'format': _index_format, 'records': records})
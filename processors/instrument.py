@@ -0,0 +1,183 @@
+"""
+Optional instrumentation of DRCOP runs, to tell where the time of a slow lab session goes. When turned on (--trace, or
+the DRCOP_TRACE environment variable), the wall and CPU time of every stage of compiling a code outline is measured,
+along with counters kept by the parser, and one JSON line per code outline is appended to a trace file of the user's
+own next to the error logs (or wherever DRCOP_TRACE points to):
+
+    {"time": ..., "pid": ..., "program": "process", "file": "proj1.oln.py", "status": "OK",
+     "stages": {"parse": {"wall": 0.0132, "cpu": 0.0129, "calls": 12}, ...},
+     "counters": {"lines": 180, "state_transitions": 61, "examples": 24, "values_cast": 72, ...}}
+
+Stages may nest (the parse stage of a streamed code outline is part of its write stage). The first record of
+a process also has the startup stage: the time from the start of the process up to when tracing started.
+
+When tracing is off, stages are a shared no-op context manager and the plain Parser is used, which counts nothing.
+"""
+
+import os, json, time, collections
+
+from parser import Parser
+from tracefile import Stage, no_stage, dump_stages, append_line
+
+# DRCOP_TRACE turns tracing on: set it to 1 to trace into the log directory, or to the path of the trace file
+_trace_env = 'DRCOP_TRACE'
+_trace_name = 'TRACE-{:d}.jsonl'  # by uid: a file created by one student could not be appended to by the others
+
+_trace = None  # Trace of the current process, while tracing
+_end = object()
+
+
+class Trace:
+    """
+    Stage timings and counters of the code outline being compiled, written out a record per code outline.
+    """
+
+    def __init__(self, path, program):
+        self.path = path
+        self.program = program
+        self.stages = {}  # name -> [wall, cpu, calls]
+        self.counters = collections.Counter()
+
+        startup = get_startup()
+        if startup:
+            self.stages['startup'] = [startup[0], startup[1], 1]
+
+    def stage(self, name):
+        return Stage(self.stages, name)
+
+    def iter_stage(self, name, iterable):
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(iterator, _end)
+            if item is _end:
+                return
+            yield item
+
+    def record(self, **fields):
+        """
+        Append a record of everything measured since the last one to the trace file, and start over.
+        :param fields: what the record is about, i.e. file='proj1.oln.py', status='OK'.
+        """
+        record = {'time': round(time.time(), 3), 'pid': os.getpid(), 'program': self.program}
+        record.update(fields)
+        record['stages'] = dump_stages(self.stages)
+        record['counters'] = dict(self.counters)
+
+        self.stages.clear()
+        self.counters.clear()
+        append_line(self.path, json.dumps(record))
+
+
+class InstrumentedParser(Parser):
+    """
+    Parser keeping count of what it does, into the counters of the trace. Used in place of Parser while tracing,
+    so that the parser pays nothing for the counters otherwise.
+    """
+
+    def __init__(self, indentation_size, recognized_primitives, channel=None, counters=None):
+        """
+        :param counters: Counter to count into; those of the current trace by default.
+        """
+        self.counters = counters if counters is not None else _trace.counters
+        Parser.__init__(self, indentation_size, recognized_primitives, channel)
+
+    def parse(self, line):
+        self.counters['lines'] += 1
+        Parser.parse(self, line)
+
+    def update_state(self, primary, sub=None):
+        state = self.state
+        if primary != state.primary or (sub is not None and sub != state.sub):
+            self.counters['state_transitions'] += 1
+        Parser.update_state(self, primary, sub)
+
+    def parse_example(self, line):
+        fxn = self.curr_fx
+        examples = len(fxn.examples) if fxn else 0
+        Parser.parse_example(self, line)
+        self.counters['examples'] += len(fxn.examples) - examples if fxn else 0
+
+    def add_arg_to_example(self, arg_val, example, ndx, offset):
+        self.counters['values_cast'] += 1
+        Parser.add_arg_to_example(self, arg_val, example, ndx, offset)
+
+    def add_rtrn_to_example(self, example, return_portion, return_portions):
+        self.counters['values_cast'] += 1
+        Parser.add_rtrn_to_example(self, example, return_portion, return_portions)
+
+    def print_parse_error(self, line, loc, msg, is_critical=False, line_number_offset=0):
+        self.counters['critical_errors' if is_critical else 'ignorable_errors'] += 1
+        Parser.print_parse_error(self, line, loc, msg, is_critical, line_number_offset)
+
+
+def start(program, path=None):
+    """
+    Start tracing the current process.
+    :param program: name of the program, as recorded.
+    :param path: trace file to append to; the one DRCOP_TRACE names (or the default one) when omitted.
+    """
+    global _trace
+    _trace = Trace(path or get_trace_path(), program)
+
+
+def is_requested():
+    """
+    :return: whether DRCOP_TRACE asks for tracing.
+    """
+    return os.environ.get(_trace_env, '') not in ('', '0')
+
+
+def is_tracing():
+    return _trace is not None
+
+
+def stage(name):
+    """
+    :return: context manager timing the given stage while tracing, and doing nothing otherwise.
+    """
+    return _trace.stage(name) if _trace else no_stage
+
+
+def iter_stage(name, iterable):
+    """
+    :return: the iterable, with the time taken to get each of its items added to the given stage while tracing.
+    """
+    return _trace.iter_stage(name, iterable) if _trace else iterable
+
+
+def count(name, n=1):
+    if _trace:
+        _trace.counters[name] += n
+
+
+def record(**fields):
+    """
+    Write out the record of the code outline just compiled, if tracing (see Trace.record).
+    """
+    if _trace:
+        _trace.record(**fields)
+
+
+def get_trace_path():
+    from logpath import _logpath  # only there where DRCOP is deployed; not needed unless tracing into it
+
+    value = os.environ.get(_trace_env, '')
+    return value if value not in ('', '0', '1') else os.path.join(_logpath, _trace_name.format(os.getuid()))
+
+
+def get_startup():
+    """
+    :return: wall and CPU time from the start of the current process up to now, or None if the start time of
+             the process cannot be told (it is read from /proc).
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+    wall = max(uptime - start_ticks / os.sysconf('SC_CLK_TCK'), 0.0)
+    return wall, time.process_time()
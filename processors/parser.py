@@ -1,6 +1,7 @@
-import re, sys
-from pydoc import locate
+import re
 from function import *
+from diagnostics import Diagnostic, DiagnosticsChannel, ParseError
+from type_registry import get_registry
 
 
 class State:
@@ -26,6 +27,8 @@ class State:
         STR = {NONE: 'NONE', CONTRACT: 'CONTRACT',
                PURPOSE: 'PURPOSE', IN_OUTS: 'IN_OUTS', EXAMPLE: 'EXAMPLE'}
 
+    __slots__ = ('primary', 'sub')
+
     def __init__(self):
         self.primary = State.Primary.INIT
         self.sub = State.Sub.NONE
@@ -37,6 +40,131 @@ class State:
         return (primary == self.primary) and ((sub == self.sub) if sub else True)
 
 
+class Line:
+    """
+    Classes of code outline lines, as far as the state machine of the parser is concerned.
+    A line is classified once, by its (stripped) head and by whether it contains an arrow (->) anywhere.
+    """
+
+    OTHER = 0
+    TRIPLE_QUOTE = 1
+    HASH = 2
+    CONTRACT = 3
+    PURPOSE = 4
+    IN_OUTS = 5
+    EXAMPLE = 6
+    ARROW = 0b1000  # flag, combined with any of the above
+
+    HEADERS = {CONTRACT: 'CONTRACT', PURPOSE: 'PURPOSE', IN_OUTS: 'IN/OUTS', EXAMPLE: 'EXAMPLE'}
+
+    @staticmethod
+    def header_pattern(header):
+        """
+        :return: regex matching exactly the heads for which line[:len(header)].upper() == header.
+        """
+        # the only non-ASCII characters that str.upper() maps onto a single ASCII letter
+        special = {'I': '\u0131', 'S': '\u017F'}
+        return ''.join('[{}{}{}]'.format(c, c.lower(), special.get(c, '')) if c.isalpha() else re.escape(c)
+                       for c in header)
+
+
+# group numbers line up with the Line classes
+_line_head = re.compile('(""")|(#)|' + '|'.join('({})'.format(Line.header_pattern(Line.HEADERS[c]))
+                                                 for c in (Line.CONTRACT, Line.PURPOSE, Line.IN_OUTS, Line.EXAMPLE)))
+
+
+# first characters a line has to start with for _line_head to match at all
+_line_head_starts = frozenset('"#CcPpIi\u0131Ee')
+
+# what the value portions of an EXAMPLE line are scanned for outside of any structure: a run of spaces and commas,
+# a (possibly unclosed) string literal, or a single quote or bracket; anything in between is taken as is
+_example_special = re.compile(r'[ ,]+|"[^"]*"?|[()\[\]{}]')
+_example_bracket = re.compile(r'[()\[\]{}]')
+_example_separators = re.compile(r'[ ,]+')
+
+
+def classify(line):
+    """
+    :param line: stripped line of the code outline.
+    :return: its Line class.
+    """
+    match = _line_head.match(line) if line[:1] in _line_head_starts else None
+    line_class = match.lastindex if match else Line.OTHER
+    return (line_class | Line.ARROW) if '->' in line else line_class
+
+
+def build_transitions():
+    """
+    Precompute the transition table of the parser, keyed on (primary state, line class).
+
+    Each entry is a sequence of steps, each step a sequence of alternative (primary, sub, max_sub) transitions:
+    the first alternative whose max_sub is None or at least the current sub state is taken.
+    (None, None, None) stands for maintaining the current state.
+    """
+    P, S = State.Primary, State.Sub
+    maintain = (None, None, None)
+    header_sub = {Line.CONTRACT: S.CONTRACT, Line.PURPOSE: S.PURPOSE, Line.IN_OUTS: S.IN_OUTS, Line.EXAMPLE: S.EXAMPLE}
+
+    def design_recipe(line_class, fallback):
+        # a design recipe header only moves the sub state forward; any line with an arrow is an EXAMPLE
+        alternatives = []
+        head = line_class & ~Line.ARROW
+        if head in header_sub:
+            alternatives.append((P.DESIGN_RECIPE, header_sub[head], header_sub[head]))
+        if line_class & Line.ARROW:
+            alternatives.append((P.DESIGN_RECIPE, S.EXAMPLE, None))
+        alternatives.append(fallback)
+        return (tuple(alternatives),)
+
+    transitions = {}
+    for line_class in range(Line.ARROW << 1):
+        head = line_class & ~Line.ARROW
+        if head > Line.EXAMPLE:
+            continue
+
+        if head == Line.TRIPLE_QUOTE:
+            # from DESIGN_RECIPE and BODY_OUTLINE, the line is re-evaluated after the first step
+            transitions[(P.INIT, line_class)] = (((P.BLOCK, S.NONE, None),),)
+            transitions[(P.BLOCK, line_class)] = (((P.INIT, S.NONE, None),),)
+            transitions[(P.DESIGN_RECIPE, line_class)] = (((P.BLOCK, S.NONE, None),), ((P.INIT, S.NONE, None),))
+            transitions[(P.BODY_OUTLINE, line_class)] = (((P.INIT, S.NONE, None),), ((P.BLOCK, S.NONE, None),))
+        else:
+            transitions[(P.INIT, line_class)] = (((P.BODY_OUTLINE, S.NONE, None) if head == Line.HASH else maintain,),)
+            transitions[(P.BLOCK, line_class)] = design_recipe(line_class, maintain)
+            transitions[(P.DESIGN_RECIPE, line_class)] = design_recipe(line_class, (P.DESIGN_RECIPE, S.NONE, None))
+            transitions[(P.BODY_OUTLINE, line_class)] = ((maintain,),)
+
+    return transitions
+
+
+_transitions = build_transitions()
+
+
+def find_function_starts(lines):
+    """
+    Find where each function of a code outline starts -- the lines Parser.parse_contract() is called for --
+    by running the state machine of the parser alone, without parsing anything.
+    :param lines: all lines of the code outline.
+    :return: list of (index of the line, primary state and sub state the parser is in before reaching it).
+    """
+    starts = []
+    primary, sub = State.Primary.INIT, State.Sub.NONE
+
+    for ndx, line in enumerate(lines):
+        before = (primary, sub)
+        for alternatives in _transitions[(primary, classify(line.strip()))]:
+            for next_primary, next_sub, max_sub in alternatives:
+                if max_sub is None or sub <= max_sub:
+                    primary = primary if next_primary is None else next_primary
+                    sub = sub if next_sub is None else next_sub
+                    break
+
+        if primary == State.Primary.DESIGN_RECIPE and sub == State.Sub.CONTRACT:
+            starts.append((ndx,) + before)
+
+    return starts
+
+
 class Parser:
     """
     Parser is a state machine that switches from a state to state while parsing.
@@ -50,9 +178,10 @@ class Parser:
     ###################################################################################################################
     # Constructors and Public Functions
 
-    def __init__(self, indentation_size, recognized_primitives):
+    def __init__(self, indentation_size, recognized_primitives, channel=None):
         """
         Mostly class member declarations and initializations.
+        :param channel: DiagnosticsChannel to report parse errors to; by default they are written to stderr right away.
         """
 
         # indentation size to use when parsing the body outline
@@ -60,6 +189,17 @@ class Parser:
 
         # used in casting primitives from str to corresponding types
         self.recognized_primitives = recognized_primitives
+        self.types = get_registry(recognized_primitives)
+
+        # where parse errors go
+        self.channel = channel if channel else DiagnosticsChannel(autoflush=True)
+
+        self.reset()
+
+    def reset(self):
+        """
+        Forget everything about the code outline parsed so far, so that this parser can be reused for the next one.
+        """
 
         # line being processed
         self.line_num = 0
@@ -113,8 +253,26 @@ class Parser:
         To be called by the client at the end of the code outline to signal the end and finalize the current function.
         """
         self.validate_current_function_completion()
+        self.curr_fx.line_range = (self.curr_fx.line_range[0], self.line_num)
         self.functions.append(self.curr_fx)
 
+    def iter_functions(self, lines):
+        """
+        Streaming alternative to calling parse() for every line and signal_EOF() at the end.
+        :param lines: any iterable of lines of a code outline, i.e. a file object or sys.stdin.
+        :return: generator yielding each Function as soon as it is complete, that is, as soon as the next CONTRACT line
+                 or the end of the lines closes it. Functions handed out this way are not kept in 'functions'.
+        """
+        for line in lines:
+            self.parse(line)
+            if self.functions:
+                completed, self.functions = self.functions, []
+                yield from completed
+
+        self.signal_EOF()
+        completed, self.functions = self.functions, []
+        yield from completed
+
     ###################################################################################################################
     # State Evaluation Functions
 
@@ -123,77 +281,13 @@ class Parser:
         Reevaluates the state of this parser based on the line being parsed.
         :param line: line to look into for determining the state (as given by the client of Parser)
         """
-        line = line.strip()
-        # current primary state is INIT
-        if self.state.is_in(State.Primary.INIT):
-            if line[:3] == '"""':
-                self.update_state(State.Primary.BLOCK, State.Sub.NONE)
-            elif line[:1] == '#':
-                self.update_state(State.Primary.BODY_OUTLINE, State.Sub.NONE)
-            else:
-                self.maintain_state()
-        # current primary state is BLOCK
-        elif self.state.is_in(State.Primary.BLOCK):
-            if line[:3] == '"""':
-                self.update_state(State.Primary.INIT, State.Sub.NONE)
-            else:
-                if not self.check_and_update_design_recipe_sub_states(line):
-                    self.maintain_state()
-        # current primary state is DESIGN_RECIPE
-        elif self.state.is_in(State.Primary.DESIGN_RECIPE):
-            if line[:3] == '"""':
-                self.update_state(State.Primary.BLOCK, State.Sub.NONE)
-                self.re_eval_state(line)
-            else:
-                if not self.check_and_update_design_recipe_sub_states(line):
-                    self.update_state(State.Primary.DESIGN_RECIPE, State.Sub.NONE)
-        # current primary state is BODY_OUTLINE
-        elif self.state.is_in(State.Primary.BODY_OUTLINE):
-            if line[:3] == '"""':
-                self.update_state(State.Primary.INIT, State.Sub.NONE)
-                self.re_eval_state(line)
-            elif line[:1] == '#':
-                self.update_state(State.Primary.BODY_OUTLINE)
-            else:
-                self.maintain_state()
-        else:
-            self.maintain_state()
-
-    def maintain_state(self):
-        """
-        Updates the state with the exact same state as the current state.
-        """
-        self.update_state(self.state.primary, self.state.sub)
-
-    def check_and_update_design_recipe_sub_states(self, line):
-        """
-        Determine which portion of the design recipe is currently being parsed.
-        :param line: line to look into for determining the state (as given by the client of Parser)
-        :return: True if sub state update occurred, otherwise False.
-        """
-        primary = State.Primary.DESIGN_RECIPE
-        return self.check_line_header_and_update_sub_state('CONTRACT', line, primary, State.Sub.CONTRACT) or \
-               self.check_line_header_and_update_sub_state('PURPOSE', line, primary, State.Sub.PURPOSE) or \
-               self.check_line_header_and_update_sub_state('IN/OUTS', line, primary, State.Sub.IN_OUTS) or \
-               self.check_line_header_and_update_sub_state('EXAMPLE', line, primary, State.Sub.EXAMPLE)
-
-    def check_line_header_and_update_sub_state(self, line_header_str, line, primary_state, sub_state):
-        """
-        Check the header of the given line and update the sub state of the parser if applicable.
-        :param line_header_str: design recipe header string: 'CONTRACT', 'PURPOSE', 'IN/OUTS', or 'EXAMPLE'.
-        :param line: line to look into for determining the state (as given by the client of Parser).
-        :param primary_state: Primary state of the parser (to be maintained), should be State.Primary.DESIGN_RECIPE
-        :param sub_state: One of the sub states matching the line_header_str
-        :return: True if sub state update occurred, otherwise False.
-        """
-        if line[:len(line_header_str)].upper() == line_header_str and self.state.sub <= sub_state:
-            self.update_state(primary_state, sub_state)
-            return True
-        elif line_header_str == 'EXAMPLE' and ('->' in line):
-            self.update_state(primary_state, sub_state)
-            return True
-        else:
-            return False
+        state = self.state
+        for alternatives in _transitions[(state.primary, classify(line.strip()))]:
+            for primary, sub, max_sub in alternatives:
+                if max_sub is None or state.sub <= max_sub:
+                    # (None, None) maintains the current state
+                    self.update_state(state.primary if primary is None else primary, sub)
+                    break
 
     def update_state(self, primary, sub=None):
         """
@@ -241,9 +335,11 @@ class Parser:
 
             if self.curr_fx:
                 self.validate_current_function_completion()
+                self.curr_fx.line_range = (self.curr_fx.line_range[0], self.line_num - 1)
                 self.functions.append(self.curr_fx)
 
             self.curr_fx = Function(func_name, arg_types, return_type)
+            self.curr_fx.line_range = (self.line_num, self.line_num)
 
     def parse_purpose(self, line):
         """
@@ -312,14 +408,14 @@ class Parser:
                 self.curr_fx.in_outs_source.append('file')
 
         inz = line[:ndx].lower().strip()
-        if inz in self.recognized_primitives:
-            self.curr_fx.ins = locate(inz)
+        if inz in self.types:
+            self.curr_fx.ins = self.types.get_type(inz)
         elif inz != 'none':
             self.print_parse_error(line, len(inz) // 2, 'Unrecognized input type ' + '\'' + inz + '\'.')
 
         outz = line[ndx + 1:comment_ndx].lower().strip()
-        if outz in self.recognized_primitives:
-            self.curr_fx.outs = locate(outz)
+        if outz in self.types:
+            self.curr_fx.outs = self.types.get_type(outz)
         elif outz != 'none':
             self.print_parse_error(line, ndx + (len(outz) // 2), 'Unrecognized output type ' + '\'' + outz + '\'.')
 
@@ -354,7 +450,7 @@ class Parser:
                 args_portion = line[:arrow_ndx].strip()
                 return_portion = line[arrow_ndx:].replace('->', '').strip()
 
-                example = Example(self.curr_fx, self.recognized_primitives)
+                example = ExampleBuilder(self.curr_fx, self.types)
                 example.expl = explanation
 
                 return_portions = self.separate_example_portions(return_portion, is_return_portion=True)
@@ -376,7 +472,7 @@ class Parser:
                                                'Expected {:d} value(s), but only got {:d} value(s).'
                                                .format(len(self.curr_fx.args_types), ndx))
 
-                self.curr_fx.examples.append(example)
+                self.curr_fx.examples.append(example.build())
 
     def add_arg_to_example(self, arg_val, example, ndx, offset):
         result = example.add_arg(arg_val)
@@ -385,7 +481,7 @@ class Parser:
             self.print_parse_error(self.line, offset,
                                    'Casting \'{}\' to {}type \'{}\' failed; defaulting to None.'
                                    .format(arg_val,
-                                           'unsupported ' if cast_type not in self.recognized_primitives else '',
+                                           'unsupported ' if cast_type not in self.types else '',
                                            cast_type))
             example.add_arg('None')
 
@@ -396,7 +492,7 @@ class Parser:
             self.print_parse_error(self.line, len(self.line) - len(return_portion[0]) - 1,
                                    'Casting \'{}\' to {}type \'{}\' failed; defaulting to None.'
                                    .format(return_portions[0],
-                                           'unsupported ' if cast_type not in self.recognized_primitives else '',
+                                           'unsupported ' if cast_type not in self.types else '',
                                            cast_type))
             example.add_rtrn('None')
 
@@ -421,87 +517,117 @@ class Parser:
         return round(hash_index / self.indent_size)
 
     def separate_example_portions(self, portion, is_return_portion=False):
+        """
+        Split the argument or return value portion of an EXAMPLE line into the value strings it consists of.
+        Values are separated by spaces or commas; string literals and bracketed structures make a single value each,
+        and whatever quotes or brackets are left open are closed at the end.
+        :return: list with a value string (or None if missing) for every argument, or just the return value.
+        """
         if not self.curr_fx:
             self.print_function_object_unpopulated_error(self.line)
 
-        portion = portion.strip().replace(',', ' ')
+        portion = portion.strip()
         args_strs = [None] if is_return_portion else [None] * len(self.curr_fx.args_types)
 
         token_match_close_open = {']': '[', ')': '(', '}': '{'}
         token_match_open_close = {'[': ']', '(': ')', '{': '}'}
 
+        # commas count as spaces throughout, string literals included
+        offset = len('EXAMPLES | ')
         ndx = 0
         prev = ' '
-        part_str = ''
+        parts = []  # slices making up the value being separated
         token_stack = []
-        in_string = False
-
-        loc = 0  # declared early to avoid UnboundLocalError when dealing with unclosed brackets
-        for loc, char in enumerate(portion, start=len('EXAMPLES | ')):
-            if char == '"' and not token_stack:
-                # manually detect literal string start and end
-                if in_string:
-                    in_string = False
-                elif not prev or prev == ' ':
-                    in_string = True
-
-                if part_str:
-                    self.add_arg_str(args_strs, ndx, part_str, loc)
-                    part_str = ''
+
+        pos = 0
+        end = len(portion)
+        next_special = _example_special.search
+        while pos < end:
+            match = next_special(portion, pos)
+            if not match:
+                # run of anything but spaces, commas, quotes and brackets, up to the end
+                parts.append(portion[pos:])
+                break
+
+            if match.start() > pos:
+                # run of anything but spaces, commas, quotes and brackets
+                parts.append(portion[pos:match.start()])
+                prev = portion[match.start() - 1]
+
+            pos = match.start()
+            next_pos = match.end()
+            char = portion[pos]
+            loc = pos + offset
+
+            if char == '"':
+                if prev != ' ':
+                    # not the start of a string literal, only ends the value (if any)
+                    next_pos = pos + 1
+                elif next_pos == pos + 1 or portion[next_pos - 1] != '"':
+                    # unclosed string literal; everything up to the end is taken as is
+                    parts.append(portion[pos + 1:].replace(',', ' ') + '"')
+                    self.print_parse_error(self.line, end - 1 + offset,
+                                           'Unclosed quote \'"\' found; DRCOP is placing \'"\' at the end.')
+                    break
+                else:
+                    # everything between the quotes is taken as is
+                    if next_pos - pos > 2:
+                        parts.append(portion[pos + 1:next_pos - 1].replace(',', ' '))
+                    loc = next_pos - 1 + offset
+
+                if parts:
+                    self.add_arg_str(args_strs, ndx, ''.join(parts), loc)
+                    parts = []
                     ndx += 1
-            elif in_string and char != '"':
-                # when in string, add everything but the double quote
-                part_str += char
-            elif not in_string:
-                # start of a next token
-                if char == ' ' and prev != ' ':
-                    # first encounter of space since the last non-space encounter
-                    if token_stack:
-                        # stack has something (inside of a structure)
-                        part_str += ','
-                    elif prev != '"':
-                        # assume it's the end of the structure unless prev == '"'
-                        # stack is empty (not inside of a structure)
-                        self.add_arg_str(args_strs, ndx, part_str, loc)
-                        part_str = ''
-                        ndx += 1
-
-                # manual bracket matching using the stack
-                elif char in ['[', '(', '{']:
-                    part_str += char
-                    token_stack.append(char)
-                elif char in [']', ')', '}']:
-                    expected_other_end = token_match_close_open[char]
-                    try:
-                        actual_other_end = token_stack.pop()
-                        if actual_other_end != expected_other_end:
-                            self.print_parse_error(self.line, loc,
-                                                   'Unmatched brackets; was expecting \'{}\' but found \'{}\'.'
-                                                   .format(expected_other_end, actual_other_end))
-                        part_str += char
-                    except IndexError:
-                        self.print_parse_error(self.line, loc,
-                                               'Unmatched brackets; \'{}\' is not matched with any open \'{}\'.'
-                                               .format(char, expected_other_end))
-                elif char != ' ':
-                    part_str += char
-
-            prev = char
-
-        if in_string:
-            part_str += '"'
-            self.print_parse_error(self.line, loc,
-                                   'Unclosed quote \'"\' found; DRCOP is placing \'"\' at the end.')
+                prev = '"'
+            elif char in ' ,':
+                # only the first space since the last non-space counts
+                if prev != ' ' and prev != '"':
+                    # assume it's the end of the value unless prev == '"'
+                    self.add_arg_str(args_strs, ndx, ''.join(parts), loc)
+                    parts = []
+                    ndx += 1
+                prev = ' '
+            elif char in '[({':
+                # manual bracket matching using the stack; a structure is taken as a whole, up to its closing bracket
+                token_stack.append(char)
+                next_pos = end
+                for match in _example_bracket.finditer(portion, pos + 1):
+                    bracket = match.group()
+                    if bracket in '[({':
+                        token_stack.append(bracket)
+                        continue
+
+                    expected_other_end = token_match_close_open[bracket]
+                    actual_other_end = token_stack.pop()
+                    if actual_other_end != expected_other_end:
+                        self.print_parse_error(self.line, match.start() + offset,
+                                               'Unmatched brackets; was expecting \'{}\' but found \'{}\'.'
+                                               .format(expected_other_end, actual_other_end))
+                    if not token_stack:
+                        next_pos = match.end()
+                        break
+
+                # inside of a structure, every run of spaces and commas becomes a single comma
+                parts.append(_example_separators.sub(',', portion[pos:next_pos]))
+                prev = portion[next_pos - 1]
+            else:
+                self.print_parse_error(self.line, loc,
+                                       'Unmatched brackets; \'{}\' is not matched with any open \'{}\'.'
+                                       .format(char, token_match_close_open[char]))
+                prev = char
+
+            pos = next_pos
 
         while token_stack:
             unclosed = token_stack.pop()
-            part_str += token_match_open_close[unclosed]
-            self.print_parse_error(self.line, loc,
+            parts.append(token_match_open_close[unclosed])
+            self.print_parse_error(self.line, end - 1 + offset,
                                    'Unclosed bracket \'{}\' found; DRCOP is placing \'{}\' at the end.'
                                    .format(unclosed, token_match_open_close[unclosed]))
 
         if ndx < len(args_strs):
-            args_strs[ndx] = part_str
+            args_strs[ndx] = ''.join(parts)
 
         return args_strs
 
@@ -554,56 +680,19 @@ class Parser:
                                'Invalid syntax caused function object to not populate (check your outline).', True)
 
     def print_parse_error(self, line, loc, msg, is_critical=False, line_number_offset=0):
+        """
+        Report a parse error on the channel, where it is kept as a Diagnostic until the channel is flushed.
+        :raise ParseError: if the parse error is critical, once it has been reported.
+        """
         try:
-            prefix = 'PARSE ERROR'
-            critical = 'CRITICAL'
-            ignorable = 'Ignorable'
-
-            severity = critical if is_critical else ignorable
-
-            content = line.replace('\n', '')
-            spaces = (' ' * loc)
-            location = ('\u2500' * loc)
-
-            # shorten the line output if it's getting too long
-            column_length_limit = 70  # TODO: Uhh ... refactor later
-            content, location, spaces = self.condense_content(column_length_limit, content, loc, location, spaces)
-
-            header_start = '\u250C\u2500 {} {} at line {:d}:\n\u2502\n'.format(
-                severity, prefix, self.line_num if self.line_num else 0 + line_number_offset
-            )
-
-            message = '\u2502  {}\n\u2502\n'.format(msg)
-            content = '\u2502    {}\n'.format(content)
-
-            arrow = '\u2502    {}\u25B2\n'.format(spaces)
-            location = '\u2514\u2500\u2500\u2500\u2500{}{}\n'.format(location, '\u2518')
-
-            print('\n' + header_start + message + content + arrow + location, file=sys.stderr)
-
-            sys.stderr.flush()
-        except:
+            diagnostic = Diagnostic(self.line_num if self.line_num else 0 + line_number_offset, loc, msg, line,
+                                    is_critical)
+        except Exception:
             self.print_parse_error(
                 line if line else '(unable to reproduce the line being processed)', loc if loc else 1,
                 'An unexpected error has occurred while attempting to report a PARSE ERROR.', is_critical=True
             )
 
+        self.channel.report(diagnostic)
         if is_critical:
-            exit(1)
-
-    def condense_content(self, column_length_limit, content, loc, location, spaces):
-        if len(content) > column_length_limit:
-            condense_from = max(0, loc - column_length_limit // 2)
-            condense_to = loc + column_length_limit // 2
-
-            is_head = condense_from > 0
-            is_tail = condense_to < len(content)
-
-            dots_prefix = '... ' if is_head else ''
-            dots_suffix = ' ...' if is_tail else ''
-            content = dots_prefix + content[condense_from:condense_to] + dots_suffix
-
-            spaces = ('    ' if is_head else '') + spaces[condense_from:condense_to]
-            location = ('\u2500\u2500\u2500\u2500' if is_head else '') + location[condense_from:condense_to]
-
-        return content, location, spaces
+            raise ParseError(diagnostic)
@@ -4,6 +4,12 @@ import sys, time, datetime, traceback, os.path
 
 from parser import Parser
 from python_writer import PythonWriter
+from diagnostics import DiagnosticsChannel, ParseError
+from cache import OutputCache, CachedOutputs
+from atomic import AtomicFile, DirectorySync, write_unique
+from reader import map_outline, read_lines, iter_lines
+import incremental
+import instrument
 from logpath import _logpath
 
 # TODO: factor these out as a config
@@ -15,6 +21,9 @@ _ut_suffix = '_tests.py'
 
 _logdata = {}
 
+# parse errors and generation messages of the current run, flushed in order
+_channel = DiagnosticsChannel()
+
 def main(args):
     input_path = args[0]
     _logdata['input_path'] = input_path
@@ -26,67 +35,234 @@ def main(args):
         print('Name of code outline file must end with ".oln.py"', file=sys.stderr)
         exit(1)
 
-    f = open(input_path)
-    lines = f.readlines()
-
-    parser = Parser(_indent_size, _recognized_primitives)
-    for l in lines:
-        parser.parse(l)
-
-    parser.signal_EOF()
-
     path_dir, template_name = parse_input_path(input_path)
     _logdata['output_path_dir'] = path_dir
 
-    if len(args) > 1 and args[1] != '--debug':
+    outputs = compile_outline(input_path, template_name)
+
+    if len(args) > 1 and args[1] not in ('--debug', '--trace'):
         path_dir = args[1]
 
     if not os.path.isdir(path_dir):
-        print('Invalid output directory path given:', path_dir, file=sys.stderr)
-        print('Falling back to current working directory:', os.getcwd(), file=sys.stderr)
+        _channel.error('Invalid output directory path given: {}'.format(path_dir))
+        _channel.error('Falling back to current working directory: {}'.format(os.getcwd()))
         path_dir = os.getcwd()
 
-    if path_dir[-1] != '/':
-        path_dir += '/'
+    write_outputs(outputs, path_dir, template_name)
+
 
+def new_parser():
+    if instrument.is_tracing():
+        return instrument.InstrumentedParser(_indent_size, _recognized_primitives, _channel)
+    return Parser(_indent_size, _recognized_primitives, _channel)
 
-    writer = PythonWriter(parser.functions, template_name)
+
+def get_config():
+    """
+    :return: parser configuration that generated outputs depend on, as used in cache keys.
+    """
+    return {'recognized_primitives': _recognized_primitives, 'indent_size': _indent_size}
+
+
+def parse_outline(input_path, parser=None):
+    """
+    Run the code outline at the given path through a Parser.
+    :param parser: parser to reuse (it is reset first); a fresh one is created when omitted.
+    :return: the parser, with its 'functions' populated.
+    """
+    with open(input_path) as f:
+        return parse_lines(f, parser)
+
+
+def parse_lines(lines, parser=None):
+    """
+    Run the lines of a code outline through a Parser.
+    :param parser: parser to reuse (it is reset first); a fresh one is created when omitted.
+    :return: the parser, with its 'functions' populated.
+    """
+    if parser:
+        parser.reset()
+    else:
+        parser = new_parser()
+
+    for l in lines:
+        parser.parse(l)
+
+    parser.signal_EOF()
+    return parser
+
+
+def compile_outline(input_path, template_name, cache=None):
+    """
+    Generate the template and unittest file contents for the code outline at the given path, taking them from the
+    cache when the very same code outline has been compiled before. Diagnostics are reported on the channel either way.
+    :param cache: OutputCache to use; the default cache of the current user when omitted.
+    :return: CachedOutputs, to be written out with write_outputs().
+    """
+    # large code outlines are hashed and decoded straight from the page cache
+    with map_outline(input_path) as outline:
+        with instrument.stage('cache'):
+            if cache is None:
+                cache = OutputCache.open_default()
+            key = cache.key(outline, get_config(), template_name) if cache else None
+            outputs = cache.get(key) if cache else None
+
+        if outputs:
+            instrument.count('cache_hits')
+            _channel.extend(outputs.diagnostics)
+            return outputs
+
+        # decoded the same way open() in text mode would have, from the exact bytes the key was computed on
+        if not cache:
+            # no index to reuse functions from, so no need to hold every line: they are parsed as they are decoded
+            return compile_lines_lazily(outline, template_name)
+
+        with instrument.stage('read'):
+            lines = read_lines(outline)
+
+    # functions that have not changed since the last run of the same code outline are reused
+    with instrument.stage('cache'):
+        index_key = cache.index_key(input_path, get_config(), template_name) if cache else None
+        records = incremental.load_index(cache.load(index_key)) if cache else None
+
+    first_entry = len(_channel.entries)
+    outputs, records = incremental.compile_lines(new_parser(), lines, template_name, records)
+    outputs.diagnostics = _channel.entries[first_entry:]
+
+    if cache:
+        with instrument.stage('cache'):
+            cache.put(key, outputs)
+            cache.store(index_key, incremental.dump_index(records))
+
+    return outputs
+
+
+def compile_lines_lazily(outline, template_name):
+    """
+    Parse the code outline line by line, as each line is decoded, and generate its template and unittest file.
+    :param outline: contents of the code outline, as bytes or mmap.
+    :return: CachedOutputs, to be written out with write_outputs().
+    """
+    first_entry = len(_channel.entries)
+
+    # reading is part of parsing here
+    with instrument.stage('parse'):
+        parser = parse_lines(instrument.iter_stage('read', iter_lines(outline)))
+
+    with instrument.stage('generate'):
+        writer = PythonWriter(parser.functions, template_name)
+        return CachedOutputs(writer.get_template(), writer.get_unittest(), _channel.entries[first_entry:])
+
+
+def write_outputs(writer, path_dir, template_name, overwrite=None):
+    """
+    Write the template and the unittest file into path_dir.
+    :param writer: Writer (or CachedOutputs) to write the files with.
+    :param overwrite: policy for files that already exist; None asks the user, True/False overwrites/skips silently.
+    :return: number of files written.
+    """
+    if path_dir[-1] != '/':
+        path_dir += '/'
 
     tpl_file_path = path_dir + template_name + _tpl_suffix
     ut_file_path = path_dir + template_name + _ut_suffix
 
-    check_dup_and_write(tpl_file_path, writer)
-    check_dup_and_write(ut_file_path, writer)
+    pending_dirs = DirectorySync()
+    written = check_dup_and_write(tpl_file_path, writer, overwrite, pending_dirs)
+    written += check_dup_and_write(ut_file_path, writer, overwrite, pending_dirs)
+    pending_dirs.sync()
+    return written
+
+
+def stream_outputs(input_path, path_dir, template_name, overwrite, parser=None, pending_dirs=None):
+    """
+    Parse the code outline and generate its template and unittest file in one go, writing every function out
+    as soon as the parser is done with it, instead of holding the whole outline in memory first.
+    Since the files are opened before parsing starts, the overwrite policy cannot be to ask the user.
+    Neither file replaces an existing one unless both have been generated in full.
+    :param parser: parser to reuse (it is reset first); a fresh one is created when omitted.
+    :param pending_dirs: DirectorySync to leave syncing the output directory to; synced right away if None.
+    :return: number of files written.
+    :raise OSError: if the files could not be written; neither of them is then left behind.
+    """
+    if path_dir[-1] != '/':
+        path_dir += '/'
+
+    if parser:
+        parser.reset()
+    else:
+        parser = new_parser()
+
+    file_paths = [path_dir + template_name + _tpl_suffix, path_dir + template_name + _ut_suffix]
+    files = []
+
+    try:
+        for p in file_paths:
+            files.append(AtomicFile(p, pending_dirs) if overwrite or not os.path.isfile(p) else None)
+
+        with instrument.stage('write'), open(input_path) as f:
+            writer = PythonWriter(instrument.iter_stage('parse', parser.iter_functions(f)), template_name)
+            is_success = writer.write_streaming(*files)
+
+        for file in files:
+            if file and is_success:
+                file.commit()
+    finally:
+        # whatever has not been committed is incomplete
+        for file in files:
+            if file:
+                file.discard()
+
+    if not is_success:
+        raise OSError('DRCOP failed to write: {}; please check directory permissions.'.format(
+            ', '.join('\'{}\''.format(p) for p, file in zip(file_paths, files) if file)))
+
+    for file_path, file in zip(file_paths, files):
+        is_test_file = file_path == file_paths[1]
+        if file:
+            _channel.info('{} file \'{}\' has been generated.'.format('Unittest' if is_test_file else 'Template',
+                                                                     file_path))
+        else:
+            _channel.info('Skipped generating a {} file.'.format('unittest' if is_test_file else 'template'))
 
+    return sum(1 for file in files if file)
 
-def check_dup_and_write(file_path, writer):
-    # stupid, but stderr and stdout mixed ain't gonna fly with 101 student
-    time.sleep(0.1)
+
+def check_dup_and_write(file_path, writer, overwrite=None, pending_dirs=None):
+    """
+    :param pending_dirs: DirectorySync to leave syncing the directory of the file to; synced right away if None.
+    :return: 1 if the file was written, 0 if it was skipped.
+    """
     is_test_file = file_path[-len(_ut_suffix):] == _ut_suffix
 
-    if get_duplicate_overwrite_permission(file_path):
-        file_to_write = open(file_path, 'w')
-        is_success = True
+    if overwrite is None:
+        permitted = get_duplicate_overwrite_permission(file_path)
+    else:
+        permitted = overwrite or not os.path.isfile(file_path)
 
-        if is_test_file:
-            is_success = writer.write_unittest(file_to_write)
-        else:
-            is_success = writer.write_template(file_to_write)
+    if permitted:
+        with instrument.stage('write'), AtomicFile(file_path, pending_dirs) as file_to_write:
+            if is_test_file:
+                is_success = writer.write_unittest(file_to_write)
+            else:
+                is_success = writer.write_template(file_to_write)
 
-        if not is_success:
-            print('DRCOP failed to write: \'{}\'' +
-                  '\nPlease check directory permissions.'.format(file_path),
-                  file=sys.stderr)
+            if not is_success:
+                file_to_write.discard()
+                _channel.error('DRCOP failed to write: \'{}\''.format(file_path) +
+                               '\nPlease check directory permissions.')
 
-        file_to_write.close()
-        print('{} file \'{}\' has been generated.'.format('Unittest' if is_test_file else 'Template', file_path))
+        _channel.info('{} file \'{}\' has been generated.'.format('Unittest' if is_test_file else 'Template', file_path))
+        return 1
     else:
-        print('Skipped generating a {} file.'.format('unittest' if is_test_file else 'template'))
+        _channel.info('Skipped generating a {} file.'.format('unittest' if is_test_file else 'template'))
+        return 0
 
 
 def get_duplicate_overwrite_permission(path_to_file):
     if os.path.isfile(path_to_file):
-        sys.stderr.flush()
+        # everything reported so far has to be on screen before the question is
+        _channel.flush()
         response = input(
             '\nFile \'{}\' already exists.\n'.format(path_to_file) +
             '\n    Overwriting it may result in PERMANENT LOSS of data!' +
@@ -115,9 +291,13 @@ def wrap_top_level_exception(e):
     ts = time.time()
     ts_str = datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
 
-    error_hash = abs(hash(e))
-    log_file_name = 'ERROR-{}.log'.format(error_hash)
-    log_file_path = _logpath + log_file_name
+    log = 'Exception occurred at {} (local timestamp)\n\n'.format(ts_str) + \
+        'Log data:\n    {}\n\n'.format(str(_logdata)) + \
+        str(e) + '\n\n' + \
+        traceback.format_exc()
+
+    # runs failing the same way at once each get a log of their own, under an error code of their own
+    error_hash = write_unique(_logpath, 'ERROR-{}'.format(abs(hash(e))), '.log', log)[len('ERROR-'):]
 
     print('\n!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!', end='\n\n')
     print('    A critical error has occurred and DRCOP had to call it quits :(', end='\n\n')
@@ -127,24 +307,40 @@ def wrap_top_level_exception(e):
     print('    Please review your code outline and try again.', end='\n\n')
     print('!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!', end='\n\n')
 
-    with open(log_file_path, 'w') as f:
-        f.write('Exception occurred at {} (local timestamp)\n\n'.format(ts_str))
-        f.write('Log data:\n    {}\n\n'.format(str(_logdata)))
-        f.write(str(e) + '\n\n')
-        f.write(traceback.format_exc())
 
-
-if __name__ == '__main__':
-    if len(sys.argv) < 2:
+def run(argv):
+    """
+    Run DRCOP as if invoked from the command line; shared by the script entry point and the DRCOP daemon.
+    :param argv: argument vector, including the program name at index 0.
+    :return: exit status to report back to the shell.
+    """
+    if len(argv) < 2:
         print('Usage: DRCOP <path_to_code_outline> [path_to_generated_output]', end='\n\n')
         print('    path_to_generated_output is optional; when omitted, path_to_code_outline is used.')
         print('    If you\'re unsure about the usage of this tool, please contact your instructor.', end='\n\n')
     else:
+        if '--trace' in argv[2:] or instrument.is_requested():
+            instrument.start('process')
+
+        status = 'FAILED'
         try:
-            main(sys.argv[1:])
+            main(argv[1:])
+            status = 'OK'
+        except ParseError:
+            return 1  # critical parse error, reported along with the others
         except Exception as e:
-            if '--debug' in sys.argv[2:]:
+            _channel.flush()
+            if '--debug' in argv[2:]:
                 raise e
             else:
                 wrap_top_level_exception(e)
-                exit(127) # error code 127 to trigger `chmod` in bash wrapper
+                return 127 # error code 127 to trigger `chmod` in bash wrapper
+        finally:
+            _channel.flush()
+            instrument.record(file=argv[1], status=status)
+
+    return 0
+
+
+if __name__ == '__main__':
+    exit(run(sys.argv))
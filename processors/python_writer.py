@@ -8,29 +8,57 @@ class PythonWriter(Writer):
         self.language = "Python 3"
         self.main = template_name
 
-    def write_template(self, file):
+    def get_template(self):
+        parts = [self.get_template_header()]
+        for fxn in self.fxns:
+            self.render_template_function(fxn, parts)
+
+        return ''.join(parts)
+
+    def get_unittest(self):
+        parts = [self.get_unittest_header(), self.get_unittest_class_wrapper()]
+        for fxn in self.fxns:
+            self.render_unittests(fxn, parts)
+        parts.append(self.get_unittest_footer())
+
+        return ''.join(parts)
+
+    def assemble_template(self, functions):
+        """
+        :param functions: template of every function, as from get_template_function().
+        :return: contents of the template file.
+        """
+        return ''.join([self.get_template_header()] + list(functions))
+
+    def assemble_unittest(self, functions):
+        """
+        :param functions: unittests of every function, as from get_unittests().
+        :return: contents of the unittest file.
+        """
+        return ''.join([self.get_unittest_header(), self.get_unittest_class_wrapper()] + list(functions) +
+                       [self.get_unittest_footer()])
+
+    def write_streaming(self, template_file, unittest_file):
+        """
+        Write the template and the unittest file side by side, in a single pass over the functions,
+        so that functions can be written out as they come out of Parser.iter_functions().
+        Either file may be None to skip writing it.
+        """
         try:
-            file.write(self.get_template_header())
+            if template_file:
+                template_file.write(self.get_template_header())
+            if unittest_file:
+                unittest_file.write(self.get_unittest_header())
+                unittest_file.write(self.get_unittest_class_wrapper())
 
             for fxn in self.fxns:
-                fxn_template = self.get_template_function(fxn)
-                file.writelines(fxn_template)
+                if template_file:
+                    template_file.write(self.get_template_function(fxn))
+                if unittest_file:
+                    unittest_file.write(self.get_unittests(fxn))
 
-        except IOError:
-            return False
-
-        return True
-
-    def write_unittest(self, file):
-        try:
-            file.write(self.get_unittest_header())
-            file.write(self.get_unittest_class_wrapper())
-
-            for fxn in self.fxns:
-                tests = self.get_unittests(fxn)
-                file.writelines(tests)
-
-            file.write(self.get_unittest_footer())
+            if unittest_file:
+                unittest_file.write(self.get_unittest_footer())
 
         except IOError:
             return False
@@ -42,22 +70,30 @@ class PythonWriter(Writer):
                'from math import sqrt\n\n'
 
     def get_template_function(self, fxn):
+        parts = []
+        self.render_template_function(fxn, parts)
+        return ''.join(parts)
+
+    def render_template_function(self, fxn, parts):
+        """
+        Append the template of the function to parts, a list of strings to be joined.
+        """
         indent = '    '
 
-        header = 'def {}({}):\n'.format(fxn.name, str(fxn.args_names).lstrip('[').rstrip(']').replace('\'', ''))
+        parts.append('def {}({}):\n'.format(fxn.name, str(fxn.args_names).lstrip('[').rstrip(']').replace('\'', '')))
 
-        design_recipe = indent + '"""\n'
+        parts.append(indent + '"""\n')
         for drl in fxn.design_recipe_lines:
-            design_recipe += indent + drl
-        design_recipe += indent + '"""\n'
+            parts += (indent, drl)
+        parts.append(indent + '"""\n')
 
-        body = indent + 'pass    # delete "pass" once you have real code for this function!\n'
+        parts.append(indent + 'pass    # delete "pass" once you have real code for this function!\n')
 
-        outline = '\n'
+        parts.append('\n')
         for oln, level in fxn.body_outlines:
-            outline += indent + (level * indent) + oln + '\n\n'
+            parts += (indent * (level + 1), oln, '\n\n')
 
-        return header + design_recipe + body + outline + '\n'
+        parts.append('\n')
 
     def get_unittest_header(self):
         return 'import unittest\nfrom {} import *\n\n'.format(self.main)
@@ -69,21 +105,27 @@ class PythonWriter(Writer):
         return '\nclass TestCases(unittest.TestCase):\n'
 
     def get_unittests(self, fxn):
+        parts = []
+        self.render_unittests(fxn, parts)
+        return ''.join(parts)
+
+    def render_unittests(self, fxn, parts):
+        """
+        Append the unittests of the function to parts, a list of strings to be joined.
+        """
         indent = '    '
-        tests = '\n' if fxn.examples else ''
+        if fxn.examples:
+            parts.append('\n')
 
         for count, ex in enumerate(fxn.examples):
-            header = indent + 'def test_{}_{:d}(self):\n'.format(fxn.name, count + 1)
-            expl = (indent * 2) + ex.expl + '\n' if ex.expl else ''
+            parts.append(indent + 'def test_{}_{:d}(self):\n'.format(fxn.name, count + 1))
+            if ex.expl:
+                parts += (indent * 2, ex.expl, '\n')
 
             expected = self.format_return_val(ex.expt)
             assert_type = self.determine_assert_type(ex.expt)
             args = str(ex.args).strip()[1:-1]
-            body = (indent * 2) + self.determine_body(assert_type, fxn.name, args, expected)
-
-            tests += header + expl + body + '\n'
-
-        return tests
+            parts += (indent * 2, self.determine_body(assert_type, fxn.name, args, expected), '\n')
 
     def determine_body(self, assert_type, fxn_name, args, expected_val):
         if assert_type in ['assertTrue', 'assertFalse']:
@@ -0,0 +1,90 @@
+"""
+Reading code outlines into lines, without holding more copies of them than it takes.
+
+Large code outlines (generated ones, archives of whole terms concatenated) are memory-mapped rather than read into
+memory, so that they can be hashed and decoded straight from the page cache instead of from a copy of their own.
+Lines are decoded a large chunk at a time, each chunk split into lines in one go, either all of them up front
+(read_lines) or only as they are parsed (iter_lines).
+
+Lines come out exactly as iterating over the file opened in text mode would produce them: decoded with the
+same encoding, universal newlines translated to '\n', and split on '\n' alone.
+"""
+
+import io, mmap, codecs, locale, contextlib
+
+_chunk_size = 1024 * 1024  # bytes decoded at a time
+_mmap_threshold = 1024 * 1024  # bytes; smaller files are simply read, mapping them costs more than it saves
+
+# line boundaries of str.splitlines() that iterating over a text file does not split on
+_other_line_breaks = '\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029'
+
+
+@contextlib.contextmanager
+def map_outline(path):
+    """
+    Map the code outline at the given path into memory, or read it if it is small.
+    :return: context manager giving the contents of the file, as a read-only buffer (mmap or bytes).
+    """
+    with open(path, 'rb') as f:
+        size = f.seek(0, io.SEEK_END)
+        if size < _mmap_threshold:
+            f.seek(0)
+            yield f.read()
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as contents:
+            yield contents
+
+
+def read_lines(contents, encoding=None):
+    """
+    :param contents: contents of a code outline, as bytes or mmap.
+    :param encoding: encoding of the code outline; that of open() in text mode by default.
+    :return: list of all lines of the code outline.
+    """
+    return list(iter_lines(contents, encoding))
+
+
+def iter_lines(contents, encoding=None):
+    """
+    Decode the lines of a code outline as they are asked for, holding no more than a chunk of them at a time
+    (and whatever part of the current line precedes it).
+    :param contents: contents of a code outline, as bytes or mmap; must stay open until every line is decoded.
+    :param encoding: encoding of the code outline; that of open() in text mode by default.
+    :return: generator of the lines of the code outline.
+    """
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding or get_encoding())(), True)
+    rest = []  # text following the last newline decoded so far, joined only once its line is complete
+
+    # slices are copies, so that nothing keeps referring to the map once it is closed
+    for start in range(0, len(contents), _chunk_size):
+        text = decoder.decode(contents[start:start + _chunk_size])
+        end = text.rfind('\n') + 1
+        if not end:
+            rest.append(text)
+            continue
+
+        rest.append(text[:end] if end < len(text) else text)
+        yield from split_lines(''.join(rest))
+        rest = [text[end:]] if end < len(text) else []
+
+    rest.append(decoder.decode(b'', final=True))
+    text = ''.join(rest)
+    if text:
+        yield from split_lines(text)
+
+
+def split_lines(text):
+    """
+    :return: list of the lines of the text, split on '\n' alone, each keeping its newline.
+    """
+    if not any(c in text for c in _other_line_breaks):
+        return text.splitlines(True)
+
+    lines = [line + '\n' for line in text.split('\n')]
+    lines[-1] = lines[-1][:-1]
+    return lines if lines[-1] else lines[:-1]
+
+
+def get_encoding():
+    return locale.getpreferredencoding(False)
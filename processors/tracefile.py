@@ -0,0 +1,83 @@
+"""
+What the traces of DRCOP (see instrument.py) and of the collector (see collect/tracelog.py) have in common: timing
+stages, and appending records to a trace file.
+
+Tracing must never get in the way of a run: a record that cannot be written is lost, which is reported (once per
+trace file) on stderr.
+"""
+
+import os, sys, time
+
+_failed_paths = set()  # trace files that could not be written to, reported once each
+
+
+class Stage:
+    """
+    Context manager adding the wall and CPU time spent within it to the totals of a stage.
+    """
+
+    def __init__(self, stages, name):
+        """
+        :param stages: totals of every stage, by name: [wall, cpu, calls].
+        """
+        self.stages = stages
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        totals = self.stages.get(self.name)
+        if totals is None:
+            totals = self.stages[self.name] = [0.0, 0.0, 0]
+        totals[0] += time.perf_counter() - self.wall
+        totals[1] += time.process_time() - self.cpu
+        totals[2] += 1
+
+
+class NoStage:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+no_stage = NoStage()
+
+
+def dump_stages(stages):
+    """
+    :param stages: totals of every stage, as kept by Stage.
+    :return: the stages as recorded in the trace.
+    """
+    return {name: {'wall': round(wall, 6), 'cpu': round(cpu, 6), 'calls': calls}
+            for name, (wall, cpu, calls) in stages.items()}
+
+
+def append_line(path, line):
+    """
+    Append a line to the file in a single write, so that lines appended by processes running at once never
+    interleave. If the file cannot be written, the line is lost.
+    """
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+    except OSError as e:
+        report_failure(path, e)
+        return
+
+    try:
+        os.write(fd, (line + '\n').encode())
+    except OSError as e:
+        report_failure(path, e)
+    finally:
+        os.close(fd)
+
+
+def report_failure(path, e):
+    if path not in _failed_paths:
+        _failed_paths.add(path)
+        print('Could not write to the trace file {}: {}'.format(path, e.strerror or e), file=sys.stderr)
@@ -0,0 +1,75 @@
+from pydoc import locate
+from ast import literal_eval
+
+_registries = {}  # recognized primitives -> TypeRegistry, see get_registry()
+
+
+class TypeRegistry:
+    """
+    Resolves type names used in code outlines (CONTRACT and IN/OUTS) to the type itself and to a caster,
+    the callable turning an example value given as a string into a value of that type.
+
+    Built once for every set of recognized primitives (see get_registry) and shared by every Parser recognizing
+    them and every example it casts, so that pydoc.locate() runs once per type rather than once per example value.
+    """
+
+    def __init__(self, recognized_primitives):
+        self.types = {}
+        self.casters = {}
+
+        for name in recognized_primitives:
+            resolved = locate(name)
+            self.register(name, resolved, cast_bool if resolved == bool else None)
+
+    def register(self, name, type, caster=None):
+        """
+        Recognize another type, i.e. register('list', list, literal_caster(list)).
+        :param name: type name as written in code outlines.
+        :param type: the type the name stands for.
+        :param caster: callable casting a str to the type, raising ValueError when it cannot; defaults to the type.
+        """
+        self.types[name] = type
+        self.casters[name] = caster if caster else type
+
+    def __contains__(self, name):
+        return name in self.types
+
+    def get_type(self, name):
+        return self.types.get(name)
+
+    def get_caster(self, name):
+        return self.casters.get(name)
+
+
+def get_registry(recognized_primitives):
+    """
+    :return: the TypeRegistry shared by everyone recognizing the given primitives; types registered with it
+             are recognized by all of them.
+    """
+    key = tuple(recognized_primitives)
+    registry = _registries.get(key)
+    if registry is None:
+        registry = _registries[key] = TypeRegistry(key)
+    return registry
+
+
+def cast_bool(val):
+    # casting str -> bool evals according to 'Truthiness'
+    return bool('' if val == 'False' else val)
+
+
+def literal_caster(type):
+    """
+    :return: caster for container types, evaluating the value as a Python literal that must be of the given type.
+    """
+    def cast(val):
+        try:
+            result = literal_eval(val)
+        except SyntaxError:
+            raise ValueError('\'{}\' is not a valid literal'.format(val))
+
+        if not isinstance(result, type):
+            raise ValueError('\'{}\' is not a {}'.format(val, type.__name__))
+        return result
+
+    return cast
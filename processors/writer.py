@@ -1,11 +1,38 @@
-
 class Writer():
     def __init__(self, functions):
         self.fxns = functions
         self.language = None
 
-    def write_template(self, file):
+    def get_template(self):
+        """
+        :return: whole contents of the template file, rendered in memory.
+        """
+        pass
+
+    def get_unittest(self):
+        """
+        :return: whole contents of the unittest file, rendered in memory.
+        """
         pass
 
+    def write_template(self, file):
+        return write_all(file, self.get_template())
+
     def write_unittest(self, file):
-        pass
\ No newline at end of file
+        return write_all(file, self.get_unittest())
+
+    def write_streaming(self, template_file, unittest_file):
+        pass
+
+
+def write_all(file, contents):
+    """
+    Write the contents out in a single write.
+    :return: whether that succeeded.
+    """
+    try:
+        file.write(contents)
+    except IOError:
+        return False
+
+    return True